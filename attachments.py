@@ -0,0 +1,173 @@
+#######################################################################
+# Suite PY is a simple Python client for SuiteCRM API.
+
+# Copyright (C) 2017-2018 BTACTIC, SCCL
+# Copyright (C) 2017-2018 Marc Sanchez Fauste
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#######################################################################
+
+import base64
+import re
+import urllib
+
+BLOCK_SIZE = 3 * 16384
+
+
+class Base64FormBody(object):
+    """
+    This class is a file-like request body that encodes a file as a base64
+    form field while it is being sent, so the file is never fully loaded in memory.
+
+    The body is made of a prefix, the url-encoded base64 representation of the file
+    and a suffix. The file must be seekable, as it is read once to compute the
+    length of the body and again each time the body is sent.
+    """
+
+    def __init__(self, prefix, file, suffix):
+        """
+        Creates a Base64FormBody instance.
+
+        :param str prefix: url-encoded data sent before the file.
+        :param file file: binary file object whose contents are sent.
+        :param str suffix: url-encoded data sent after the file.
+        """
+        self._prefix = prefix
+        self._file = file
+        self._suffix = suffix
+        self._start = file.tell()
+        self._length = len(prefix) + len(suffix) + sum(len(block) for block in self._blocks())
+        self.rewind()
+
+    def _blocks(self):
+        self._file.seek(self._start)
+        while True:
+            data = self._file.read(BLOCK_SIZE)
+            if not data:
+                return
+            yield urllib.quote_plus(base64.b64encode(data))
+
+    def rewind(self):
+        """
+        Restart the body, so it can be sent again.
+        """
+        self._parts = self._iter_parts()
+        self._buffer = ''
+
+    def _iter_parts(self):
+        yield self._prefix
+        for block in self._blocks():
+            yield block
+        yield self._suffix
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            try:
+                self._buffer += next(self._parts)
+            except StopIteration:
+                break
+        if size < 0:
+            size = len(self._buffer)
+        data = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return data
+
+
+class Base64FieldDecoder(object):
+    """
+    This class decodes a JSON response while it is being received, writing the
+    base64 decoded contents of a string field to a file instead of keeping them in memory.
+
+    The rest of the response is kept, with the field value replaced by an empty string,
+    and can be parsed once the whole response is fed.
+    """
+
+    def __init__(self, field_name, file):
+        """
+        Creates a Base64FieldDecoder instance.
+
+        :param str field_name: name of the JSON field that contains base64 data.
+        :param file file: binary file object where decoded contents are written.
+        """
+        self._field_pattern = re.compile(r'"' + re.escape(field_name) + r'"\s*:\s*"')
+        self._file = file
+        self._head = ''
+        self._tail = ''
+        self._pending = ''
+        self._state = 'head'
+        self.size = 0
+
+    def feed(self, data):
+        """
+        Process a chunk of the response.
+
+        :param str data: chunk of the response.
+        """
+        if self._state == 'head':
+            self._head += data
+            match = self._field_pattern.search(self._head)
+            if not match:
+                return
+            data = self._head[match.end():]
+            self._head = self._head[:match.end()]
+            self._state = 'field'
+        if self._state == 'field':
+            end = data.find('"')
+            if end < 0:
+                self._write(data)
+                return
+            self._write(data[:end])
+            self._flush()
+            data = data[end:]
+            self._state = 'tail'
+        self._tail += data
+
+    def _write(self, data):
+        data = self._pending + data.replace('\\', '')
+        usable = len(data) - len(data) % 4
+        self._pending = data[usable:]
+        if usable:
+            decoded = base64.b64decode(data[:usable])
+            self._file.write(decoded)
+            self.size += len(decoded)
+
+    def _flush(self):
+        if self._pending:
+            decoded = base64.b64decode(self._pending)
+            self._file.write(decoded)
+            self.size += len(decoded)
+            self._pending = ''
+
+    @property
+    def found(self):
+        """
+        Check whether the field has been found in the response.
+
+        :return: True if the field has been found, False otherwise.
+        :rtype: bool
+        """
+        return self._state != 'head'
+
+    @property
+    def text(self):
+        """
+        Get the response without the contents of the field.
+
+        :return: JSON text of the response.
+        :rtype: str
+        """
+        return self._head + self._tail
@@ -30,6 +30,7 @@ class Bean(object):
         self._set_name_value_list(name_value_list)
         self._relationship_list = {}
         self._set_relationship_list(relationship_list)
+        self._access_hook = None
 
     def _set_name_value_list(self, name_value_list):
         for key, value in name_value_list.items():
@@ -46,6 +47,8 @@ class Bean(object):
             self._relationship_list[relationship['name']] = records
 
     def __getitem__(self, field_name):
+        if self._access_hook is not None:
+            self._access_hook(self, field_name)
         if field_name in self._fields:
             return self._fields[field_name]
         elif field_name in self._relationship_list:
@@ -0,0 +1,326 @@
+#######################################################################
+# Suite PY is a simple Python client for SuiteCRM API.
+
+# Copyright (C) 2017-2018 BTACTIC, SCCL
+# Copyright (C) 2017-2018 Marc Sanchez Fauste
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#######################################################################
+
+"""
+Benchmark suite of the SuitePY client hot paths.
+
+The benchmarks run against a local MockSuiteCRMServer, so no SuiteCRM instance is needed.
+Results are stored as JSON files that can be compared with a previous run:
+
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/baseline.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BASE_DIR, 'benchmarks', 'results')
+sys.path.insert(0, BASE_DIR)
+
+from mock_server import MockSuiteCRM, MockSuiteCRMServer
+
+
+def write_config(url, username, password):
+    """
+    Write a temporary config file for the mock server and make it the default config.
+
+    :param str url: URL of the mock server.
+    :param str username: login username.
+    :param str password: login password.
+    :return: path of the config file.
+    :rtype: str
+    """
+    fd, path = tempfile.mkstemp(suffix='.ini', prefix='suitepy-benchmark-')
+    with os.fdopen(fd, 'w') as f:
+        f.write('[SuiteCRM API Credentials]\n')
+        f.write('url = %s\n' % url)
+        f.write('username = %s\n' % username)
+        f.write('password = %s\n' % password)
+        f.write('application_name = SuitePY benchmark\n')
+        f.write('verify_ssl = True\n')
+    os.environ['SUITEPY_CONFIG'] = path
+    return path
+
+
+def percentile(values, q):
+    """
+    Get a percentile of a sorted list of values.
+
+    :param list[float] values: sorted values.
+    :param float q: percentile, between 0 and 100.
+    :return: the percentile value.
+    :rtype: float
+    """
+    if not values:
+        return None
+    index = min(len(values) - 1, int(round(q / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+def measure(function, iterations, warm_up=3):
+    """
+    Measure the throughput, latency, CPU time and memory of a function.
+
+    :param function function: function to measure, called without arguments.
+    :param int iterations: number of measured calls.
+    :param int warm_up: number of calls made before measuring.
+    :return: measured metrics.
+    :rtype: dict[str, float]
+    """
+    for _ in range(warm_up):
+        function()
+    gc.collect()
+    objects_before = len(gc.get_objects())
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    cpu_before = os.times()
+    latencies = []
+    start = time.time()
+    for _ in range(iterations):
+        call_start = time.time()
+        function()
+        latencies.append(time.time() - call_start)
+    elapsed = time.time() - start
+    cpu_after = os.times()
+    latencies.sort()
+    return {
+        "iterations": iterations,
+        "seconds": elapsed,
+        "ops_per_second": iterations / elapsed if elapsed else None,
+        "latency_p50_ms": percentile(latencies, 50) * 1000,
+        "latency_p95_ms": percentile(latencies, 95) * 1000,
+        "latency_p99_ms": percentile(latencies, 99) * 1000,
+        "latency_max_ms": latencies[-1] * 1000,
+        "cpu_seconds": (cpu_after[0] - cpu_before[0]) + (cpu_after[1] - cpu_before[1]),
+        "peak_rss_growth_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before,
+        "live_objects_growth": len(gc.get_objects()) - objects_before
+    }
+
+
+def create_mock(args):
+    mock = MockSuiteCRM(latency=args.latency, max_page_size=args.page_size, seed=1)
+    accounts = mock.populate('Accounts', args.records, text_size=args.text_size)
+    contacts = mock.populate('Contacts', args.related)
+    for contact_id in contacts:
+        mock.relate('Accounts', accounts[0], 'contacts', 'Contacts', contact_id)
+    return mock, accounts
+
+
+def create_large_request():
+    """
+    Create the form fields of a set_entries request of 20 Accounts with 50 fields.
+
+    :return: form fields of the request.
+    :rtype: dict[str, str]
+    """
+    from suitecrm import SuiteCRM
+
+    return SuiteCRM._encode_request('set_entries', {
+        'session': 'benchmark',
+        'module_name': 'Accounts',
+        'name_value_lists': [[{'name': 'field_%d' % j, 'value': 'value: "field_%d", %d' % (j, i)}
+                              for j in range(50)] for i in range(20)]
+    })
+
+
+def get_benchmarks(args, accounts):
+    from bean import Bean
+    from config import Config
+    from request_encoder import RequestEncoder
+    from suitecrm import SuiteCRM
+    from suitecrm_cached import SuiteCRMCached
+
+    crm = SuiteCRM()
+    settings = {'url': crm.conf.url, 'username': crm.conf.username, 'password': crm.conf.password}
+    cached_crm = SuiteCRMCached()
+    cached_crm._max_cached_requests = len(accounts) + 10
+
+    name_value_list = dict(
+        ('field_%d' % i, {'name': 'field_%d' % i, 'value': 'value %d' % i}) for i in range(50))
+    relationship_list = [{'name': 'contacts', 'records': [
+        dict(('field_%d' % i, {'name': 'field_%d' % i, 'value': 'value'}) for i in range(5))
+        for _ in range(10)]}]
+    bean = Bean('Accounts', name_value_list)
+    state = {'index': 0}
+
+    def next_id():
+        state['index'] = (state['index'] + 1) % len(accounts)
+        return accounts[state['index']]
+
+    def cached_miss():
+        cached_crm.clear_cache()
+        cached_crm.get_bean('Accounts', accounts[0])
+
+    def import_client():
+        subprocess.check_call([sys.executable, '-c', 'import suitecrm, suitecrm_cached'],
+                              cwd=BASE_DIR)
+
+    def first_call():
+        client = SuiteCRM(Config.from_dict(settings))
+        client.get_bean('Accounts', accounts[0])
+        client.transport.close()
+
+    large_request = create_large_request()
+    url_encoder = RequestEncoder(multipart_threshold=None)
+    multipart_encoder = RequestEncoder()
+    gzip_encoder = RequestEncoder(compress=True)
+
+    def save_bean():
+        new_bean = Bean('Accounts')
+        new_bean['name'] = 'Benchmark'
+        crm.save_bean(new_bean)
+
+    return [
+        ('startup_import', import_client, 0.05),
+        ('startup_first_call', first_call, 0.5),
+        ('bean_construction', lambda: Bean('Accounts', name_value_list, relationship_list), 20),
+        ('bean_getitem', lambda: bean['field_25'], 100),
+        ('bean_name_value_list', lambda: bean.name_value_list, 20),
+        ('suitecrm_get_bean', lambda: crm.get_bean('Accounts', next_id()), 1),
+        ('suitecrm_get_bean_list', lambda: crm.get_bean_list('Accounts', max_results=args.page_size), 1),
+        ('suitecrm_iter_relationships', lambda: sum(1 for _ in crm.iter_relationships(
+            'Accounts', accounts[0], 'contacts', limit=args.page_size)), 0.1),
+        ('suitecrm_count_beans', lambda: crm.count_beans('Accounts', ttl=0), 1),
+        ('suitecrm_iter_bean_list_keyset', lambda: sum(1 for _ in crm.iter_bean_list(
+            'Accounts', limit=args.page_size)), 0.02),
+        ('suitecrm_iter_bean_list_offset', lambda: sum(1 for _ in crm.iter_bean_list(
+            'Accounts', limit=args.page_size, keyset=False)), 0.02),
+        ('suitecrm_save_bean', save_bean, 1),
+        ('encode_request_urlencoded', lambda: url_encoder.encode(large_request), 5),
+        ('encode_request_multipart', lambda: multipart_encoder.encode(large_request), 5),
+        ('encode_request_gzip', lambda: gzip_encoder.encode(large_request), 5),
+        ('cached_get_bean_hit', lambda: cached_crm.get_bean('Accounts', accounts[0]), 20),
+        ('cached_get_bean_miss', cached_miss, 1),
+    ]
+
+
+def get_request_sizes():
+    """
+    Get the bytes sent by each request encoding for a set_entries request of 20 Accounts
+    with 50 fields, compared to the url-encoded form with default JSON separators.
+
+    :return: bytes of each encoding.
+    :rtype: dict[str, int]
+    """
+    from request_encoder import RequestEncoder
+
+    request = create_large_request()
+    encoder = RequestEncoder(multipart_threshold=None, measure=True)
+    sizes = {
+        'urlencoded': len(encoder.encode(request)[0]),
+        'multipart': len(RequestEncoder().encode(request)[0]),
+        'gzip': len(RequestEncoder(compress=True).encode(request)[0])
+    }
+    sizes['legacy'] = encoder.get_stats()['set_entries']['legacy_bytes']
+    return sizes
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare benchmark results with a baseline.
+
+    :param dict results: results of the current run.
+    :param dict baseline: results of a previous run.
+    :param float threshold: relative throughput loss considered a regression.
+    :return: list of the names of the regressed benchmarks.
+    :rtype: list[str]
+    """
+    regressions = []
+    print('\n%-30s %14s %14s %9s' % ('benchmark', 'baseline op/s', 'current op/s', 'change'))
+    for name, metrics in sorted(results['results'].items()):
+        previous = baseline['results'].get(name)
+        if not previous or not previous['ops_per_second'] or not metrics['ops_per_second']:
+            continue
+        change = metrics['ops_per_second'] / previous['ops_per_second'] - 1
+        flag = ''
+        if change < -threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print('%-30s %14.1f %14.1f %+8.1f%%%s' % (
+            name, previous['ops_per_second'], metrics['ops_per_second'], change * 100, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run SuitePY benchmarks against a mock SuiteCRM.')
+    parser.add_argument('--iterations', type=int, default=200,
+                        help='base number of iterations of each benchmark')
+    parser.add_argument('--filter', default='', help='run only benchmarks containing this text')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds of latency added by the mock server to every request')
+    parser.add_argument('--page-size', type=int, default=20, help='records per page')
+    parser.add_argument('--records', type=int, default=1000, help='number of mock Accounts')
+    parser.add_argument('--related', type=int, default=200, help='number of related Contacts')
+    parser.add_argument('--text-size', type=int, default=200,
+                        help='size of the description field of the mock Accounts')
+    parser.add_argument('--output', help='file where results are stored')
+    parser.add_argument('--compare', help='results file of a previous run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative throughput loss reported as a regression')
+    args = parser.parse_args()
+
+    mock, accounts = create_mock(args)
+    with MockSuiteCRMServer(mock) as server:
+        config_path = write_config(server.url, mock.username, mock.password)
+        try:
+            results = {
+                "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "settings": vars(args),
+                "results": {},
+                "request_bytes": get_request_sizes()
+            }
+            for name, function, factor in get_benchmarks(args, accounts):
+                if args.filter not in name:
+                    continue
+                iterations = max(1, int(args.iterations * factor))
+                results['results'][name] = metrics = measure(function, iterations)
+                print('%-30s %10.1f op/s  p50 %8.3f ms  p99 %8.3f ms  cpu %6.3f s' % (
+                    name, metrics['ops_per_second'], metrics['latency_p50_ms'],
+                    metrics['latency_p99_ms'], metrics['cpu_seconds']))
+        finally:
+            os.remove(config_path)
+
+    output = args.output
+    if not output:
+        if not os.path.isdir(RESULTS_DIR):
+            os.makedirs(RESULTS_DIR)
+        output = os.path.join(RESULTS_DIR, time.strftime('%Y%m%d-%H%M%S') + '.json')
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print('\nResults stored on ' + output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,304 @@
+#######################################################################
+# Suite PY is a simple Python client for SuiteCRM API.
+
+# Copyright (C) 2017-2018 BTACTIC, SCCL
+# Copyright (C) 2017-2018 Marc Sanchez Fauste
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#######################################################################
+
+import csv
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+from bean import Bean
+from thread_pool import ThreadPool
+
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def iter_csv(file, module_name, encoding='utf-8', **kwargs):
+    """
+    Read Beans from a CSV file whose first row contains the names of the fields.
+
+    :param file: path or file object of the CSV file.
+    :param str module_name: name of the module of the beans.
+    :param str encoding: encoding of the file.
+    :param kwargs: other arguments of csv.DictReader, like delimiter.
+    :return: generator of Bean objects.
+    :rtype: generator
+    """
+    f = open(file, 'rb') if isinstance(file, basestring) else file
+    try:
+        for row in csv.DictReader(f, **kwargs):
+            bean = Bean(module_name)
+            for name, value in row.items():
+                if name is None:
+                    continue
+                bean[name.decode(encoding)] = value.decode(encoding) if value is not None else u''
+            yield bean
+    finally:
+        if f is not file:
+            f.close()
+
+
+def iter_ndjson(file, module_name):
+    """
+    Read Beans from a file with a JSON object of fields on each line.
+
+    :param file: path or file object of the file.
+    :param str module_name: name of the module of the beans.
+    :return: generator of Bean objects.
+    :rtype: generator
+    """
+    f = open(file) if isinstance(file, basestring) else file
+    try:
+        for line in f:
+            if line.strip():
+                bean = Bean(module_name)
+                bean._fields.update(json.loads(line))
+                yield bean
+    finally:
+        if f is not file:
+            f.close()
+
+
+class ImportJournal(object):
+    """
+    This class records the progress of a BulkImport on an append-only file of JSON lines.
+
+    Before a batch is written, a line with the positions of its beans in the source and
+    the IDs given to the new ones is appended; after it is written, a line with the
+    positions that failed. Lines are flushed to disk before the batch is sent, so after
+    a crash the journal tells which beans were written, which failed, and which may
+    have been created with a known ID. A truncated last line is ignored.
+    """
+
+    def __init__(self, path, sync=True):
+        """
+        Creates an ImportJournal instance, loading the progress recorded on the file.
+
+        :param str path: path of the journal.
+        :param bool sync: fsync the journal after each line, so it survives power losses.
+        """
+        self.path = path
+        self.sync = sync
+        self._lock = threading.Lock()
+        self._records = {}
+        self._batches = 0
+        self._file = None
+        self._load()
+
+    def _load(self):
+        try:
+            f = open(self.path)
+        except IOError:
+            return
+        batches = {}
+        with f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                batch = entry['batch']
+                self._batches = max(self._batches, batch + 1)
+                if 'positions' in entry:
+                    batches[batch] = entry['positions']
+                    for position, id in zip(entry['positions'], entry['ids']):
+                        self._records[position] = [id, PENDING]
+                else:
+                    failed = set(entry['failed'])
+                    for position in batches.pop(batch, []):
+                        self._records[position][1] = FAILED if position in failed else DONE
+
+    def get(self, position):
+        """
+        Get the recorded progress of a bean.
+
+        :param int position: position of the bean in the source.
+        :return: the ID given to the bean if it was new, or None, and its state:
+            pending, done or failed. None if the bean was never written.
+        :rtype: tuple[str, str]
+        """
+        with self._lock:
+            record = self._records.get(position)
+        return tuple(record) if record is not None else None
+
+    def begin(self, positions, ids):
+        """
+        Record that a batch of beans is about to be written.
+
+        :param list[int] positions: positions of the beans in the source.
+        :param list[str] ids: IDs given to the new beans, None for the other beans.
+        :return: the number of the batch.
+        :rtype: int
+        """
+        with self._lock:
+            batch = self._batches
+            self._batches += 1
+            for position, id in zip(positions, ids):
+                self._records[position] = [id, PENDING]
+            self._append({'batch': batch, 'positions': positions, 'ids': ids})
+        return batch
+
+    def complete(self, batch, positions, failed):
+        """
+        Record that a batch of beans has been written.
+
+        :param int batch: the number of the batch.
+        :param list[int] positions: positions of the beans of the batch.
+        :param dict[int, str] failed: errors of the beans that failed, by position.
+        """
+        with self._lock:
+            for position in positions:
+                self._records[position][1] = FAILED if position in failed else DONE
+            self._append({'batch': batch, 'failed': sorted(failed), 'errors': failed})
+
+    def _append(self, entry):
+        if self._file is None:
+            self._file = open(self.path, 'a')
+        self._file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        self._file.flush()
+        if self.sync:
+            os.fsync(self._file.fileno())
+
+    def get_stats(self):
+        """
+        Get the number of beans in each state.
+
+        :return: dict with the number of pending, done and failed beans.
+        :rtype: dict[str, int]
+        """
+        stats = {PENDING: 0, DONE: 0, FAILED: 0}
+        with self._lock:
+            for _, state in self._records.values():
+                stats[state] += 1
+        return stats
+
+    def close(self):
+        """
+        Close the journal file.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class BulkImport(object):
+    """
+    This class imports Beans from a streaming source, like iter_csv, iter_ndjson or
+    any iterable of Beans, writing them in batches with save_beans on a bounded
+    number of threads, and recording the progress on an ImportJournal.
+
+    Running an import again with the same journal and the same source, in the
+    same order, skips the beans already written. New beans are given their ID before
+    being written, so beans of batches interrupted by a crash are written again with
+    the same ID, as updates when SuiteCRM already created them, never duplicated.
+    """
+
+    def __init__(self, client, journal, batch_size=100, max_workers=4, retry_failed=True):
+        """
+        Creates a BulkImport instance.
+
+        :param SuiteCRM client: client used to write the beans.
+        :param journal: ImportJournal, or path of the journal.
+        :param int batch_size: number of beans written on each request.
+        :param int max_workers: maximum number of batches written concurrently.
+        :param bool retry_failed: write again the beans that failed on previous runs.
+        """
+        self.client = client
+        self.journal = ImportJournal(journal) if isinstance(journal, basestring) else journal
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.retry_failed = retry_failed
+
+    def run(self, beans):
+        """
+        Import the beans not written yet.
+
+        :param iterable beans: Bean objects, in the same order on every run.
+        :return: dict containing the number of saved and skipped beans, and the list
+            of (bean, exception) tuples of the beans that failed.
+        :rtype: dict[str, object]
+        """
+        result = {'saved': 0, 'skipped': 0, 'failed': []}
+        pool = ThreadPool(self.max_workers)
+        try:
+            for batch, saved, error in pool.imap_unordered(self._write_batch,
+                                                           self._get_batches(beans, result)):
+                if error is not None:
+                    result['failed'].extend((bean, error) for _, bean, _ in batch)
+                    continue
+                result['saved'] += saved['saved']
+                result['failed'].extend(saved['failed'])
+        finally:
+            pool.shutdown()
+            self.journal.close()
+        return result
+
+    def _get_batches(self, beans, result):
+        batch = []
+        for position, bean in enumerate(beans):
+            record = self.journal.get(position)
+            if record is not None:
+                id, state = record
+                if state == DONE or (state == FAILED and not self.retry_failed):
+                    result['skipped'] += 1
+                    continue
+                if id:
+                    bean['id'] = id
+                batch.append((position, bean, id))
+            else:
+                batch.append((position, bean, None))
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _write_batch(self, batch):
+        in_doubt = OrderedDict()
+        for _, bean, journaled_id in batch:
+            if journaled_id:
+                in_doubt.setdefault(bean.module, []).append(bean)
+            elif not bean['id']:
+                bean['id'] = str(uuid.uuid4())
+                bean['new_with_id'] = True
+        for module_name, module_beans in in_doubt.items():
+            existing = set(found['id'] for found in self.client.get_beans(
+                module_name, [bean['id'] for bean in module_beans], ['id']))
+            for bean in module_beans:
+                if bean['id'] in existing:
+                    bean._fields.pop('new_with_id', None)
+                else:
+                    bean['new_with_id'] = True
+        positions = [position for position, _, _ in batch]
+        number = self.journal.begin(positions, [
+            bean['id'] if bean['new_with_id'] else journaled_id
+            for _, bean, journaled_id in batch
+        ])
+        saved = self.client.save_beans([bean for _, bean, _ in batch], len(batch))
+        errors = dict((id(bean), error) for bean, error in saved['failed'])
+        self.journal.complete(number, positions, dict(
+            (position, repr(errors[id(bean)]))
+            for position, bean, _ in batch if id(bean) in errors
+        ))
+        return saved
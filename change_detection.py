@@ -0,0 +1,250 @@
+#######################################################################
+# Suite PY is a simple Python client for SuiteCRM API.
+
+# Copyright (C) 2017-2018 BTACTIC, SCCL
+# Copyright (C) 2017-2018 Marc Sanchez Fauste
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#######################################################################
+
+import hashlib
+import itertools
+import json
+import sqlite3
+import struct
+import threading
+
+from bean import Bean
+
+# Fields that SuiteCRM updates on every save, which never make a bean different.
+IGNORED_FIELDS = ('date_modified', 'modified_user_id', 'modified_by_name', 'new_with_id')
+
+
+def _field_digest(value):
+    if value is None:
+        value = u''
+    elif not isinstance(value, basestring):
+        value = json.dumps(value, sort_keys=True) if isinstance(value, (list, dict)) \
+            else unicode(value)
+    if isinstance(value, unicode):
+        value = value.encode('utf8')
+    return struct.unpack('<q', hashlib.sha1(value).digest()[:8])[0]
+
+
+class MemoryDigestStore(object):
+    """
+    This class keeps the digests of the beans in memory.
+    """
+
+    def __init__(self):
+        self._digests = {}
+        self._lock = threading.Lock()
+
+    def get(self, module_name, id):
+        with self._lock:
+            return self._digests.get((module_name, id))
+
+    def set_many(self, items):
+        with self._lock:
+            for module_name, id, digests in items:
+                self._digests[(module_name, id)] = digests
+
+    def clear(self):
+        with self._lock:
+            self._digests.clear()
+
+
+class SQLiteDigestStore(object):
+    """
+    This class keeps the digests of the beans on a SQLite database,
+    so they are kept between runs of a synchronization.
+    """
+
+    def __init__(self, path):
+        """
+        Creates a SQLiteDigestStore instance.
+
+        :param str path: path of the database.
+        """
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS digests ('
+                               'module TEXT, id TEXT, digests TEXT, PRIMARY KEY (module, id))')
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = sqlite3.connect(self.path, timeout=30)
+        return connection
+
+    def get(self, module_name, id):
+        row = self._connect().execute('SELECT digests FROM digests WHERE module = ? AND id = ?',
+                                      (module_name, id)).fetchone()
+        if row is None:
+            return None
+        return dict((name, int(digest)) for name, digest in json.loads(row[0]).items())
+
+    def set_many(self, items):
+        with self._connect() as connection:
+            connection.executemany('INSERT OR REPLACE INTO digests VALUES (?, ?, ?)', [
+                (module_name, id, json.dumps(digests, separators=(',', ':')))
+                for module_name, id, digests in items
+            ])
+
+    def clear(self):
+        with self._connect() as connection:
+            connection.execute('DELETE FROM digests')
+
+
+class ChangeDetector(object):
+    """
+    This class detects which beans, and which of their fields, changed since they were
+    last written to SuiteCRM, so synchronizations only write what actually changed.
+
+    For each bean it keeps a 64 bit digest of the last written value of every field.
+    Beans without an ID, or without digests, are considered changed. The digests can
+    be loaded from the beans currently on SuiteCRM with prime, so the first run of a
+    synchronization doesn't write every bean.
+    """
+
+    def __init__(self, store=None, ignored_fields=IGNORED_FIELDS):
+        """
+        Creates a ChangeDetector instance.
+
+        :param store: store of the digests, by default a MemoryDigestStore.
+        :param iterable ignored_fields: fields never compared.
+        """
+        self.store = store if store is not None else MemoryDigestStore()
+        self.ignored_fields = frozenset(ignored_fields)
+        self._lock = threading.Lock()
+        self.stats = {'written': 0, 'skipped': 0, 'failed': 0}
+
+    def get_changes(self, bean):
+        """
+        Get the fields of a bean that changed since it was last written.
+
+        :param Bean bean: Bean object.
+        :return: dict with the changed fields and their values, empty if nothing changed.
+        :rtype: dict[str, object]
+        """
+        fields = dict((name, value) for name, value in bean._fields.items()
+                      if name not in self.ignored_fields and name != 'id')
+        if not bean['id']:
+            return fields
+        digests = self.store.get(bean.module, bean['id'])
+        if digests is None:
+            return fields
+        return dict((name, value) for name, value in fields.items()
+                    if digests.get(name) != _field_digest(value))
+
+    def record(self, bean, fields=None):
+        """
+        Record the values of a bean as written to SuiteCRM.
+
+        :param Bean bean: Bean object, with its ID.
+        :param iterable fields: fields written, by default all of them.
+        """
+        self.store.set_many([self._get_digests(bean, fields)])
+
+    def _get_digests(self, bean, fields=None):
+        digests = self.store.get(bean.module, bean['id']) if fields is not None else None
+        digests = digests or {}
+        for name in (fields if fields is not None else bean._fields):
+            if name not in self.ignored_fields and name != 'id':
+                digests[name] = _field_digest(bean._fields.get(name))
+        return bean.module, bean['id'], digests
+
+    def prime(self, beans):
+        """
+        Record the values of beans retrieved from SuiteCRM, for example with
+        SuiteCRM.iter_bean_list, as the last written values.
+
+        :param iterable beans: Bean objects.
+        :return: number of recorded beans.
+        :rtype: int
+        """
+        count = 0
+        batch = []
+        for bean in beans:
+            batch.append(self._get_digests(bean))
+            if len(batch) >= 1000:
+                self.store.set_many(batch)
+                count += len(batch)
+                batch = []
+        self.store.set_many(batch)
+        return count + len(batch)
+
+    def save_beans(self, client, beans, chunk_size=100, changed_fields_only=True):
+        """
+        Save the beans that changed since they were last written.
+
+        The beans are read and written in slices of chunk_size beans, and the digests of
+        each slice are stored as soon as it is written, so memory stays bounded and the
+        progress of a run that dies partway is kept.
+
+        :param SuiteCRM client: client used to save the beans.
+        :param iterable beans: Bean objects.
+        :param int chunk_size: maximum number of beans sent on each request.
+        :param bool changed_fields_only: send only the changed fields of the beans
+            that already exist, instead of all their fields.
+        :return: dict containing the number of written and skipped beans, and the list
+            of (bean, exception) tuples of the beans that failed.
+        :rtype: dict[str, object]
+        """
+        totals = {'written': 0, 'skipped': 0, 'failed': []}
+        beans = iter(beans)
+        while True:
+            chunk = list(itertools.islice(beans, chunk_size))
+            if not chunk:
+                break
+            self._save_chunk(client, chunk, changed_fields_only, totals)
+        return totals
+
+    def _save_chunk(self, client, beans, changed_fields_only, totals):
+        pending = []
+        skipped = 0
+        for bean in beans:
+            changes = self.get_changes(bean)
+            if not changes:
+                skipped += 1
+                continue
+            if changed_fields_only and bean['id']:
+                changed_bean = Bean(bean.module)
+                changed_bean._fields.update(changes)
+                changed_bean['id'] = bean['id']
+            else:
+                changed_bean = bean
+            pending.append((bean, changed_bean, changes))
+        result = {'saved': 0, 'failed': []}
+        if pending:
+            result = client.save_beans([changed_bean for _, changed_bean, _ in pending],
+                                       len(pending))
+        failed = dict((id(bean), error) for bean, error in result['failed'])
+        failures = []
+        written = []
+        for bean, changed_bean, changes in pending:
+            if id(changed_bean) in failed:
+                failures.append((bean, failed[id(changed_bean)]))
+                continue
+            bean['id'] = changed_bean['id']
+            written.append(self._get_digests(bean, changes))
+        self.store.set_many(written)
+        with self._lock:
+            self.stats['written'] += result['saved']
+            self.stats['skipped'] += skipped
+            self.stats['failed'] += len(failures)
+        totals['written'] += result['saved']
+        totals['skipped'] += skipped
+        totals['failed'].extend(failures)
@@ -0,0 +1,152 @@
+#######################################################################
+# Suite PY is a simple Python client for SuiteCRM API.
+
+# Copyright (C) 2017-2018 BTACTIC, SCCL
+# Copyright (C) 2017-2018 Marc Sanchez Fauste
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#######################################################################
+
+import threading
+from collections import OrderedDict
+
+from config import Config
+from suitecrm import SuiteCRM
+from thread_pool import ThreadPool
+from transport import HTTPTransport
+
+
+class ClientRegistry(object):
+    """
+    This class holds independent clients of many SuiteCRM instances.
+
+    All the clients share a pool of worker threads, used to run work on several
+    instances concurrently, and a bound on the number of requests sent
+    concurrently to all the instances.
+    """
+
+    def __init__(self, max_workers=16, max_connections=64, connections_per_client=2):
+        """
+        Creates a ClientRegistry instance.
+
+        :param int max_workers: number of worker threads shared by all the clients.
+        :param int max_connections: maximum number of requests sent concurrently by all the clients.
+        :param int connections_per_client: maximum number of connections kept open by each client.
+        """
+        self.pool = ThreadPool(max_workers)
+        self._limiter = threading.BoundedSemaphore(max_connections)
+        self._connections_per_client = connections_per_client
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, name, conf, client_class=SuiteCRM):
+        """
+        Create and register a client. The client logs in when it makes its first request.
+
+        :param str name: name used to retrieve the client.
+        :param conf: config of the client, a Config or a dict accepted by Config.from_dict.
+        :param type client_class: SuiteCRM or one of its subclasses, like SuiteCRMCached.
+        :return: the created client.
+        :rtype: SuiteCRM
+        """
+        if isinstance(conf, dict):
+            conf = Config.from_dict(conf)
+        transport = HTTPTransport(max_connections=self._connections_per_client,
+                                  limiter=self._limiter)
+        client = client_class(conf, transport)
+        with self._lock:
+            previous = self._clients.get(name)
+            self._clients[name] = client
+        if previous is not None:
+            self._close_client(previous)
+        return client
+
+    def unregister(self, name):
+        """
+        Remove a client from the registry and close its connections.
+
+        :param str name: name of the client.
+        """
+        with self._lock:
+            client = self._clients.pop(name, None)
+        if client is not None:
+            self._close_client(client)
+
+    @staticmethod
+    def _close_client(client):
+        close = getattr(client.transport, 'close', None)
+        if close is not None:
+            close()
+
+    def get(self, name):
+        """
+        Get a registered client.
+
+        :param str name: name of the client.
+        :return: the client.
+        :rtype: SuiteCRM
+        :raises KeyError: if there is no client registered with that name.
+        """
+        with self._lock:
+            return self._clients[name]
+
+    def __getitem__(self, name):
+        return self.get(name)
+
+    def __contains__(self, name):
+        with self._lock:
+            return name in self._clients
+
+    def __len__(self):
+        with self._lock:
+            return len(self._clients)
+
+    @property
+    def names(self):
+        """
+        Get the names of the registered clients.
+
+        :return: list of names.
+        :rtype: list[str]
+        """
+        with self._lock:
+            return list(self._clients.keys())
+
+    def map(self, function, names=None):
+        """
+        Run a function with several clients concurrently on the shared worker pool.
+
+        :param function function: function that receives a client.
+        :param list[str] names: names of the clients, all of them if not specified.
+        :return: dict with the (result, exception) tuple of every client name.
+        :rtype: dict[str, tuple]
+        """
+        if names is None:
+            names = self.names
+        results = OrderedDict((name, None) for name in names)
+        for name, result, error in self.pool.imap_unordered(
+                lambda name: function(self.get(name)), names):
+            results[name] = (result, error)
+        return results
+
+    def close(self):
+        """
+        Close the connections of all the clients and stop the worker pool.
+        """
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            self._close_client(client)
+        self.pool.shutdown()
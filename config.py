@@ -19,54 +19,140 @@
 #######################################################################
 
 import ConfigParser
+import logging
 import os.path
 
+logger = logging.getLogger(__name__)
 
-class Config:
+_SECTION = "SuiteCRM API Credentials"
+
+_ENVIRONMENT_VARIABLES = (
+    ("url", "SUITEPY_URL"),
+    ("username", "SUITEPY_USERNAME"),
+    ("password", "SUITEPY_PASSWORD"),
+    ("application_name", "SUITEPY_APPLICATION_NAME"),
+    ("verify_ssl", "SUITEPY_VERIFY_SSL"),
+    ("profile", "SUITEPY_PROFILE"),
+    ("session_store", "SUITEPY_SESSION_STORE"),
+)
+
+
+class ConfigFileNotFoundException(IOError):
+    """
+    Exception raised when the config file does not exist.
+    A config file with example settings is created on its path.
+    """
+    pass
+
+
+def _parse_bool(value):
+    if isinstance(value, basestring):
+        return value.strip().lower() not in ("", "0", "false", "no", "off")
+    return bool(value)
+
+
+class Config(object):
     """
     This class is used to read from a file the access credentials of a SuiteCRM API.
 
     This avoids the need of hard-code the credentials in the code.
+
+    Settings are resolved the first time they are accessed, so creating a Config
+    reads nothing. They are taken from, in order of preference: the dictionary
+    given to from_dict, the specified file, the SUITEPY_URL, SUITEPY_USERNAME
+    and SUITEPY_PASSWORD environment variables (with the optional
+    SUITEPY_APPLICATION_NAME, SUITEPY_VERIFY_SSL, SUITEPY_PROFILE and
+    SUITEPY_SESSION_STORE), and
+    finally the file specified by SUITEPY_CONFIG or suitepy.ini.
     """
 
-    def __init__(self, config_file="suitepy.ini"):
+    def __init__(self, config_file=None):
         """
         Creates a Config instance loading settings from specified file.
 
         :param str config_file: file from which the configuration will be read.
+            By default, the settings of the environment variables or, if SUITEPY_URL is
+            not set, the file specified by the SUITEPY_CONFIG environment variable
+            or suitepy.ini.
+        """
+        self._config_file = config_file
+        self._settings = None
+
+    @classmethod
+    def from_dict(cls, settings):
+        """
+        Creates a Config instance from a dictionary, without reading any file.
+
+        :param dict[str, object] settings: dictionary with the url, username and password
+            keys, and optionally the application_name, verify_ssl, profile and session_store keys.
+        :return: the config.
+        :rtype: Config
+        """
+        config = cls()
+        config._load_settings(settings)
+        return config
+
+    @classmethod
+    def from_environment(cls):
         """
+        Creates a Config instance from the SUITEPY_* environment variables.
+
+        :return: the config.
+        :rtype: Config
+        """
+        settings = dict((key, os.environ[variable])
+                        for key, variable in _ENVIRONMENT_VARIABLES if variable in os.environ)
+        return cls.from_dict(settings)
+
+    def _load_settings(self, settings):
+        self._settings = {
+            "url": settings["url"],
+            "username": settings["username"],
+            "password": settings["password"],
+            "application_name": settings.get("application_name", "SuitePY"),
+            "verify_ssl": _parse_bool(settings.get("verify_ssl", True)),
+            "profile": settings.get("profile"),
+            "session_store": settings.get("session_store")
+        }
+
+    def _get_setting(self, name):
+        if self._settings is None:
+            self._load()
+        return self._settings[name]
+
+    def _load(self):
+        config_file = self._config_file
+        if config_file is None:
+            if os.environ.get("SUITEPY_URL"):
+                self._settings = Config.from_environment()._settings
+                return
+            config_file = os.environ.get("SUITEPY_CONFIG", "suitepy.ini")
         if os.path.isabs(config_file):
             abs_path = config_file
         else:
             base_dir = os.path.dirname(os.path.abspath(__file__))
             abs_path = os.path.join(base_dir, config_file)
-        if os.path.isfile(abs_path):
-            print("Loading config from file: " + abs_path)
-            self._load_config_file(abs_path)
-        else:
-            print("Creating new config file on: " + abs_path)
-            print("Please edit config file and rerun the application.")
+        if not os.path.isfile(abs_path):
             self._create_config_file(abs_path)
-            exit(0)
+            raise ConfigFileNotFoundException(
+                "Config file not found, an example config file was created on: " + abs_path)
+        logger.debug("Loading config from file: %s", abs_path)
+        self._load_config_file(abs_path)
 
     def _load_config_file(self, config_file):
         config = ConfigParser.ConfigParser()
         config.read(config_file)
-        self._url = config.get("SuiteCRM API Credentials", "url")
-        self._username = config.get("SuiteCRM API Credentials", "username")
-        self._password = config.get("SuiteCRM API Credentials", "password")
-        self._application_name = config.get("SuiteCRM API Credentials", "application_name")
-        self._verify_ssl = bool(config.get("SuiteCRM API Credentials", "verify_ssl"))
+        self._load_settings(dict(config.items(_SECTION)))
 
     def _create_config_file(self, config_file):
         config_file = open(config_file, "w")
         config = ConfigParser.ConfigParser()
-        config.add_section("SuiteCRM API Credentials")
-        config.set("SuiteCRM API Credentials", "url", "https://example.org/service/v4_1/rest.php")
-        config.set("SuiteCRM API Credentials", "username", "api")
-        config.set("SuiteCRM API Credentials", "password", "123456")
-        config.set("SuiteCRM API Credentials", "application_name", "SuitePY")
-        config.set("SuiteCRM API Credentials", "verify_ssl", True)
+        config.add_section(_SECTION)
+        config.set(_SECTION, "url", "https://example.org/service/v4_1/rest.php")
+        config.set(_SECTION, "username", "api")
+        config.set(_SECTION, "password", "123456")
+        config.set(_SECTION, "application_name", "SuitePY")
+        config.set(_SECTION, "verify_ssl", True)
         config.write(config_file)
         config_file.close()
 
@@ -78,7 +164,7 @@ class Config:
         :return: SuiteCRM REST API URL
         :rtype: str
         """
-        return self._url
+        return self._get_setting("url")
 
     @property
     def username(self):
@@ -88,7 +174,7 @@ class Config:
         :return: login username.
         :rtype: str
         """
-        return self._username
+        return self._get_setting("username")
 
     @property
     def password(self):
@@ -98,7 +184,7 @@ class Config:
         :return: login password.
         :rtype: str
         """
-        return self._password
+        return self._get_setting("password")
 
     @property
     def application_name(self):
@@ -108,7 +194,7 @@ class Config:
         :return: application name.
         :rtype: str
         """
-        return self._application_name
+        return self._get_setting("application_name")
 
     @property
     def verify_ssl(self):
@@ -118,4 +204,24 @@ class Config:
         :return: True if SSL certificate must be verified, False otherwise.
         :rtype: bool
         """
-        return self._verify_ssl
+        return self._get_setting("verify_ssl")
+
+    @property
+    def profile(self):
+        """
+        Get the profiling mode of the client hot paths.
+
+        :return: deterministic, sampling, or None if profiling is disabled.
+        :rtype: str
+        """
+        return self._get_setting("profile")
+
+    @property
+    def session_store(self):
+        """
+        Get the path of the store where sessions are shared between processes.
+
+        :return: path of the session store, or None if sessions are not shared.
+        :rtype: str
+        """
+        return self._get_setting("session_store")
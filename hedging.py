@@ -0,0 +1,257 @@
+#######################################################################
+# Suite PY is a simple Python client for SuiteCRM API.
+
+# Copyright (C) 2017-2018 BTACTIC, SCCL
+# Copyright (C) 2017-2018 Marc Sanchez Fauste
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#######################################################################
+
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from Queue import Queue
+
+from thread_pool import ThreadPool
+
+# Read methods that can be sent twice without side effects.
+HEDGED_METHODS = ('get_entry', 'get_entries', 'get_entry_list')
+
+
+class _HedgeTimer(threading.Thread):
+
+    def __init__(self):
+        super(_HedgeTimer, self).__init__()
+        self.daemon = True
+        self._condition = threading.Condition()
+        self._deadlines = []
+        self._counter = itertools.count()
+
+    def schedule(self, delay, function):
+        with self._condition:
+            heapq.heappush(self._deadlines, (time.time() + delay, next(self._counter), function))
+            self._condition.notify()
+
+    def run(self):
+        while True:
+            with self._condition:
+                if not self._deadlines:
+                    self._condition.wait()
+                    continue
+                remaining = self._deadlines[0][0] - time.time()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+                _, _, function = heapq.heappop(self._deadlines)
+            try:
+                function()
+            except Exception:
+                pass
+
+
+class RequestHedger(object):
+    """
+    This class sends a duplicate of the read requests that take longer than usual,
+    and returns the response that arrives first, so a request served by a slow PHP
+    worker doesn't make the caller wait for it.
+
+    The latencies of the last requests of each method are tracked, and a request that
+    hasn't completed after the chosen percentile of them is hedged. By default the
+    duplicate is sent on a second SuiteCRM session, as PHP locks the session of a
+    request while it is being served and a duplicate on the same session would wait
+    for it. The extra load is capped: hedges can never be more than max_extra_load
+    of the requests of each method, besides a small burst.
+
+    Hedged requests are sent from worker threads, and only for idempotent methods.
+    When a RequestScheduler is enabled, a hedge shares the slot of the request it
+    duplicates, so it is only bounded by max_extra_load.
+    """
+
+    def __init__(self, methods=HEDGED_METHODS, percentile=95, min_delay=0.02, max_delay=None,
+                 window=200, min_samples=20, max_extra_load=0.1, burst=5,
+                 separate_session=True, max_workers=32):
+        """
+        Creates a RequestHedger instance.
+
+        :param iterable methods: methods whose requests may be hedged.
+        :param float percentile: percentile of the latencies of a method after which
+            its requests are hedged.
+        :param float min_delay: minimum seconds before hedging a request.
+        :param float max_delay: maximum seconds before hedging a request, None for no maximum.
+        :param int window: number of latencies tracked for each method.
+        :param int min_samples: number of latencies of a method needed to hedge its requests.
+        :param float max_extra_load: maximum ratio of hedges to requests of each method.
+        :param int burst: number of hedges that can be sent in a row before being limited
+            by max_extra_load.
+        :param bool separate_session: send the hedges on a second SuiteCRM session.
+        :param int max_workers: maximum number of threads sending requests.
+        """
+        self.methods = frozenset(methods)
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.window = window
+        self.min_samples = min_samples
+        self.max_extra_load = max_extra_load
+        self.burst = burst
+        self.separate_session = separate_session
+        self._pool = ThreadPool(max_workers)
+        self._lock = threading.Lock()
+        self._methods = {}
+        self._timer = None
+
+    def _get_method(self, method):
+        state = self._methods.get(method)
+        if state is None:
+            state = self._methods[method] = {
+                'latencies': deque(maxlen=self.window),
+                'observed': 0,
+                'delay': None,
+                'budget': float(self.burst),
+                'requests': 0,
+                'hedged': 0,
+                'hedge_wins': 0
+            }
+        return state
+
+    def observe(self, method, latency):
+        """
+        Record the latency of a request.
+
+        :param str method: method of the request.
+        :param float latency: seconds taken by the request.
+        """
+        with self._lock:
+            state = self._get_method(method)
+            state['latencies'].append(latency)
+            state['observed'] += 1
+            if len(state['latencies']) >= self.min_samples and \
+                    (state['delay'] is None or state['observed'] % 10 == 0):
+                latencies = sorted(state['latencies'])
+                index = min(len(latencies) - 1, int(len(latencies) * self.percentile / 100.0))
+                delay = max(self.min_delay, latencies[index])
+                if self.max_delay is not None:
+                    delay = min(self.max_delay, delay)
+                state['delay'] = delay
+
+    def get_delay(self, method):
+        """
+        Get the seconds after which a request of a method is hedged.
+
+        :param str method: method of the request.
+        :return: the seconds, or None while there are not enough latencies of the method.
+        :rtype: float
+        """
+        with self._lock:
+            return self._get_method(method)['delay']
+
+    def _take_budget(self, method):
+        with self._lock:
+            state = self._get_method(method)
+            if state['budget'] < 1:
+                return False
+            state['budget'] -= 1
+            state['hedged'] += 1
+            return True
+
+    def _get_timer(self):
+        with self._lock:
+            if self._timer is None:
+                self._timer = _HedgeTimer()
+                self._timer.start()
+            return self._timer
+
+    def call(self, method, send, send_hedge):
+        """
+        Send a request, hedging it if it takes longer than usual.
+
+        :param str method: method of the request.
+        :param function send: function without arguments that sends the request.
+        :param function send_hedge: function without arguments that sends the duplicate.
+        :return: the first successful response.
+        :raises Exception: the error of the request, if it and its duplicate failed.
+        """
+        with self._lock:
+            state = self._get_method(method)
+            state['requests'] += 1
+            state['budget'] = min(self.burst, state['budget'] + self.max_extra_load)
+            delay = state['delay']
+        if delay is None:
+            start = time.time()
+            response = send()
+            self.observe(method, time.time() - start)
+            return response
+        results = Queue()
+        hedge_state = {'finished': False, 'hedged': False}
+        hedge_lock = threading.Lock()
+
+        def track(kind, start):
+            def done(future):
+                if future.exception() is None:
+                    self.observe(method, time.time() - start)
+                results.put((kind, future))
+            return done
+
+        def hedge():
+            with hedge_lock:
+                if hedge_state['finished'] or primary.done() or not self._take_budget(method):
+                    return
+                hedge_state['hedged'] = True
+            self._pool.submit(send_hedge).add_done_callback(track('hedge', time.time()))
+
+        primary = self._pool.submit(send)
+        primary.add_done_callback(track('primary', time.time()))
+        self._get_timer().schedule(delay, hedge)
+        kind, future = results.get()
+        with hedge_lock:
+            hedge_state['finished'] = True
+            hedged = hedge_state['hedged']
+        if future.exception() is None:
+            if kind == 'hedge':
+                with self._lock:
+                    state['hedge_wins'] += 1
+            return future.result()
+        if kind == 'hedge':
+            return primary.result()
+        if hedged:
+            _, hedge_future = results.get()
+            if hedge_future.exception() is None:
+                with self._lock:
+                    state['hedge_wins'] += 1
+                return hedge_future.result()
+        return future.result()
+
+    def get_stats(self):
+        """
+        Get the statistics of the hedged methods.
+
+        :return: dict with the number of requests, of hedges and of hedges that
+            returned first, and the current hedging delay, of each method.
+        :rtype: dict[str, dict[str, object]]
+        """
+        with self._lock:
+            return dict((method, {
+                'requests': state['requests'],
+                'hedged': state['hedged'],
+                'hedge_wins': state['hedge_wins'],
+                'delay': state['delay']
+            }) for method, state in self._methods.items())
+
+    def shutdown(self):
+        """
+        Stop the threads sending requests once they are done.
+        """
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,322 @@
+#######################################################################
+# Suite PY is a simple Python client for SuiteCRM API.
+
+# Copyright (C) 2017-2018 BTACTIC, SCCL
+# Copyright (C) 2017-2018 Marc Sanchez Fauste
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#######################################################################
+
+import threading
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Instrumentation(object):
+    """
+    This class dispatches the events produced by a SuiteCRM client to the registered hooks.
+
+    The following events are emitted, with the listed keyword arguments:
+
+    - before_call: method, parameters.
+    - after_call: method, error, request_bytes, response_bytes, result_count and the
+      encode, network, decode and total durations in seconds.
+    - retry: method, reason.
+    - relogin: method.
+    - cache_hit: method.
+    - cache_miss: method.
+    - cache_stale: method, when an expired cached request is served while it is refreshed.
+    - cache_refresh: method, reason (stale or ahead), error, when a background refresh ends.
+    - negative_cache_hit: method, when a missing bean or module is answered from the cache.
+    - beans_built: method, count, duration.
+    """
+
+    def __init__(self, collector=None):
+        """
+        Creates an Instrumentation instance.
+
+        :param MetricsCollector collector: collector to attach to this instance.
+        """
+        self._hooks = {}
+        self.collector = collector
+        if collector is not None:
+            collector.install(self)
+
+    def add_hook(self, event, hook):
+        """
+        Register a function that will be called every time an event is emitted.
+
+        :param str event: name of the event.
+        :param function hook: function that receives the event arguments as keyword arguments.
+        """
+        self._hooks.setdefault(event, []).append(hook)
+
+    def remove_hook(self, event, hook):
+        """
+        Unregister a function previously registered with add_hook.
+
+        :param str event: name of the event.
+        :param function hook: function to unregister.
+        """
+        hooks = self._hooks.get(event, [])
+        if hook in hooks:
+            hooks.remove(hook)
+
+    def emit(self, event, **kwargs):
+        """
+        Call all the functions registered for an event.
+
+        :param str event: name of the event.
+        """
+        for hook in self._hooks.get(event, ()):
+            hook(**kwargs)
+
+
+class Histogram(object):
+    """
+    This class counts observed values on cumulative buckets.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        Creates a Histogram instance.
+
+        :param tuple[float] buckets: upper bounds of the buckets, in ascending order.
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """
+        Add a value to the histogram.
+
+        :param float value: observed value.
+        """
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """
+        Estimate a quantile of the observed values from the buckets.
+
+        :param float q: quantile to estimate, between 0 and 1.
+        :return: estimated quantile, or None if there are no observations.
+        :rtype: float
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        accumulated = 0
+        lower = 0.0
+        for i, bound in enumerate(self.buckets):
+            if accumulated + self.counts[i] >= rank:
+                if not self.counts[i]:
+                    return bound
+                return lower + (bound - lower) * (rank - accumulated) / self.counts[i]
+            accumulated += self.counts[i]
+            lower = bound
+        return self.buckets[-1] if self.buckets else None
+
+    def snapshot(self):
+        """
+        Get a summary of the histogram.
+
+        :return: dict with count, sum, p50, p95 and p99 values.
+        :rtype: dict[str, float]
+        """
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99)
+        }
+
+
+class MetricsCollector(object):
+    """
+    This class collects metrics from the events of an Instrumentation instance.
+
+    It records per method latency histograms of each phase of the calls,
+    request and response sizes, errors, retries, re-logins and cache hits and misses.
+    """
+
+    PHASES = ('encode', 'network', 'decode', 'total')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        Creates a MetricsCollector instance.
+
+        :param tuple[float] buckets: upper bounds in seconds of the latency histogram buckets.
+        """
+        self._buckets = buckets
+        self._lock = threading.Lock()
+        self.reset()
+
+    def install(self, instrumentation):
+        """
+        Register the hooks of this collector on an Instrumentation instance.
+
+        :param Instrumentation instrumentation: instrumentation to collect events from.
+        """
+        instrumentation.add_hook('after_call', self._after_call)
+        instrumentation.add_hook('retry', self._retry)
+        instrumentation.add_hook('relogin', self._relogin)
+        instrumentation.add_hook('cache_hit', self._cache_hit)
+        instrumentation.add_hook('cache_miss', self._cache_miss)
+        instrumentation.add_hook('cache_stale', self._cache_stale)
+        instrumentation.add_hook('cache_refresh', self._cache_refresh)
+        instrumentation.add_hook('negative_cache_hit', self._negative_cache_hit)
+        instrumentation.add_hook('beans_built', self._beans_built)
+
+    def reset(self):
+        """
+        Discard all the collected metrics.
+        """
+        with self._lock:
+            self._latencies = {}
+            self._counters = {}
+
+    def _histogram(self, name, method, phase=None):
+        key = (name, method, phase)
+        histogram = self._latencies.get(key)
+        if histogram is None:
+            histogram = self._latencies[key] = Histogram(self._buckets)
+        return histogram
+
+    def _increment(self, name, method=None, value=1):
+        key = (name, method)
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def _after_call(self, method, error=None, request_bytes=0, response_bytes=0,
+                    result_count=None, **durations):
+        with self._lock:
+            for phase in self.PHASES:
+                if durations.get(phase) is not None:
+                    self._histogram('call_duration_seconds', method, phase).observe(durations[phase])
+            self._increment('calls_total', method)
+            self._increment('request_bytes_total', method, request_bytes)
+            self._increment('response_bytes_total', method, response_bytes)
+            if error is not None:
+                self._increment('call_errors_total', method)
+
+    def _retry(self, method, reason=None):
+        with self._lock:
+            self._increment('retries_total', method)
+
+    def _relogin(self, method):
+        with self._lock:
+            self._increment('relogins_total')
+
+    def _cache_hit(self, method):
+        with self._lock:
+            self._increment('cache_hits_total', method)
+
+    def _cache_miss(self, method):
+        with self._lock:
+            self._increment('cache_misses_total', method)
+
+    def _cache_stale(self, method):
+        with self._lock:
+            self._increment('cache_stale_hits_total', method)
+
+    def _cache_refresh(self, method, reason=None, error=None):
+        with self._lock:
+            self._increment('cache_refreshes_total', method)
+            if error is not None:
+                self._increment('cache_refresh_errors_total', method)
+
+    def _negative_cache_hit(self, method):
+        with self._lock:
+            self._increment('negative_cache_hits_total', method)
+
+    def _beans_built(self, method, count, duration):
+        with self._lock:
+            self._histogram('bean_build_duration_seconds', method).observe(duration)
+            self._increment('beans_built_total', method, count)
+
+    def snapshot(self):
+        """
+        Get the collected metrics.
+
+        :return: dict with the latency summaries of every method and phase,
+            the counters of every method and the cache hit ratio of every method.
+        :rtype: dict[str, object]
+        """
+        with self._lock:
+            latencies = {}
+            for (name, method, phase), histogram in self._latencies.items():
+                latency = latencies.setdefault(name, {}).setdefault(method, {})
+                latency[phase or 'total'] = histogram.snapshot()
+            counters = {}
+            for (name, method), value in self._counters.items():
+                counters.setdefault(name, {})[method] = value
+        cache_hit_ratio = {}
+        hits = counters.get('cache_hits_total', {})
+        misses = counters.get('cache_misses_total', {})
+        for method in set(hits) | set(misses):
+            total = hits.get(method, 0) + misses.get(method, 0)
+            cache_hit_ratio[method] = float(hits.get(method, 0)) / total
+        return {
+            "latencies": latencies,
+            "counters": counters,
+            "cache_hit_ratio": cache_hit_ratio
+        }
+
+    def to_prometheus(self, prefix='suitepy_'):
+        """
+        Export the collected metrics using the Prometheus text format.
+
+        :param str prefix: prefix of the metric names.
+        :return: metrics in Prometheus text format.
+        :rtype: str
+        """
+        lines = []
+        with self._lock:
+            histograms = sorted(self._latencies.items())
+            counters = sorted(self._counters.items())
+        seen = set()
+        for (name, method, phase), histogram in histograms:
+            metric = prefix + name
+            if metric not in seen:
+                seen.add(metric)
+                lines.append('# TYPE %s histogram' % metric)
+            labels = 'method="%s"' % method
+            if phase:
+                labels += ',phase="%s"' % phase
+            accumulated = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                accumulated += count
+                lines.append('%s_bucket{%s,le="%s"} %d' % (metric, labels, bound, accumulated))
+            lines.append('%s_bucket{%s,le="+Inf"} %d' % (metric, labels, histogram.count))
+            lines.append('%s_sum{%s} %f' % (metric, labels, histogram.sum))
+            lines.append('%s_count{%s} %d' % (metric, labels, histogram.count))
+        for (name, method), value in counters:
+            metric = prefix + name
+            if metric not in seen:
+                seen.add(metric)
+                lines.append('# TYPE %s counter' % metric)
+            if method is None:
+                lines.append('%s %d' % (metric, value))
+            else:
+                lines.append('%s{method="%s"} %d' % (metric, method, value))
+        return '\n'.join(lines) + '\n'
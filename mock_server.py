@@ -0,0 +1,738 @@
+#######################################################################
+# Suite PY is a simple Python client for SuiteCRM API.
+
+# Copyright (C) 2017-2018 BTACTIC, SCCL
+# Copyright (C) 2017-2018 Marc Sanchez Fauste
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#######################################################################
+
+import BaseHTTPServer
+import SocketServer
+import base64
+import cgi
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import urlparse
+import uuid
+import zlib
+from StringIO import StringIO
+from collections import OrderedDict
+
+ERRORS = {
+    10: ('Invalid Login', 'Login attempt failed please check the username and password'),
+    11: ('Invalid Session ID', 'The session ID is invalid'),
+    20: ('Module Does Not Exist', 'This module is not available on this server'),
+    31: ('Relationship Not Supported', 'This type of relationship is not supported'),
+    40: ('Access Denied', 'You do not have access'),
+    90: ('Resource management error', 'Resource query limit has been exceeded'),
+    1000: ('Invalid call error', 'This method is not supported by the module'),
+}
+
+
+class MockSuiteCRM(object):
+    """
+    This class is an in-memory implementation of the SuiteCRM v4_1 REST API,
+    intended for tests and benchmarks that must not depend on a live CRM.
+
+    It implements login, get_entry, get_entries, get_entry_list, get_entries_count,
+    set_entry, set_entries, get_relationships, set_relationship, set_relationships,
+    get_note_attachment, set_note_attachment, get_module_fields, get_available_modules
+    and get_pdf_template. Queries support comparisons, LIKE, IN, IS NULL, AND, OR and NOT.
+
+    Latency, the maximum page size and errors can be configured to reproduce
+    the behaviour of a real instance.
+    """
+
+    METHODS = ('get_entry', 'get_entries', 'get_entry_list', 'get_entries_count', 'set_entry',
+               'set_entries', 'get_relationships', 'set_relationship', 'set_relationships',
+               'get_note_attachment', 'set_note_attachment', 'get_module_fields',
+               'get_available_modules', 'get_pdf_template')
+
+    def __init__(self, username='api', password='123456', latency=0.0, latency_jitter=0.0,
+                 max_page_size=20, error_rate=0.0, error_number=90, seed=None):
+        """
+        Creates a MockSuiteCRM instance.
+
+        :param str username: valid login username.
+        :param str password: valid login password.
+        :param float latency: seconds added to every request.
+        :param float latency_jitter: maximum random seconds added to the latency.
+        :param int max_page_size: maximum number of records returned by list requests.
+        :param float error_rate: probability of failing a request, between 0 and 1.
+        :param int error_number: SuiteCRM error number returned by failed requests.
+        :param int seed: seed of the random number generator.
+        """
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.max_page_size = max_page_size
+        self.error_rate = error_rate
+        self.error_number = error_number
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._sessions = set()
+        self._modules = OrderedDict()
+        self._relationships = {}
+        self._attachments = {}
+        self._failures = []
+        self.calls = []
+
+    def add_module(self, module_name):
+        """
+        Make a module available without records.
+
+        :param str module_name: name of the module.
+        """
+        with self._lock:
+            self._modules.setdefault(module_name, OrderedDict())
+
+    def add_bean(self, module_name, fields):
+        """
+        Add a record to a module.
+
+        :param str module_name: name of the module.
+        :param dict[str, str] fields: fields of the record. An id is generated if missing.
+        :return: the id of the record.
+        :rtype: str
+        """
+        with self._lock:
+            record = dict(fields)
+            record.setdefault('id', str(uuid.uuid4()))
+            record.setdefault('deleted', '0')
+            record.setdefault('date_entered', time.strftime('%Y-%m-%d %H:%M:%S'))
+            self._modules.setdefault(module_name, OrderedDict())[record['id']] = record
+            return record['id']
+
+    def populate(self, module_name, count, text_size=0):
+        """
+        Add generated records to a module.
+
+        :param str module_name: name of the module.
+        :param int count: number of records to add.
+        :param int text_size: size of a generated description field, to make wide rows.
+        :return: list of the ids of the records.
+        :rtype: list[str]
+        """
+        ids = []
+        for i in range(count):
+            ids.append(self.add_bean(module_name, {
+                'id': '%s-%08d' % (module_name.lower(), i),
+                'name': '%s %d' % (module_name, i),
+                'date_entered': '2018-01-01 %02d:%02d:%02d' % (i // 3600 % 24, i // 60 % 60, i % 60),
+                'description': 'x' * text_size
+            }))
+        return ids
+
+    def relate(self, module_name, module_id, link_field_name, related_module, related_id):
+        """
+        Relate two records.
+
+        :param str module_name: module of the primary record.
+        :param str module_id: id of the primary record.
+        :param str link_field_name: name of the link field.
+        :param str related_module: module of the related record.
+        :param str related_id: id of the related record.
+        """
+        with self._lock:
+            related = self._relationships.setdefault((module_name, module_id, link_field_name), [])
+            if (related_module, related_id) not in related:
+                related.append((related_module, related_id))
+
+    def fail_next(self, method, number, count=1):
+        """
+        Make the next calls of a method fail with a SuiteCRM error.
+
+        :param str method: name of the method, or None for any method.
+        :param int number: SuiteCRM error number.
+        :param int count: number of calls that will fail.
+        """
+        with self._lock:
+            for _ in range(count):
+                self._failures.append((method, number))
+
+    def expire_sessions(self):
+        """
+        Invalidate all the sessions, so clients must login again.
+        """
+        with self._lock:
+            self._sessions.clear()
+
+    def get_bean(self, module_name, id):
+        """
+        Get a stored record.
+
+        :param str module_name: name of the module.
+        :param str id: id of the record.
+        :return: fields of the record or None.
+        :rtype: dict[str, str]
+        """
+        with self._lock:
+            return self._modules.get(module_name, {}).get(id)
+
+    def handle(self, method, parameters):
+        """
+        Process an API call.
+
+        :param str method: name of the method.
+        :param dict parameters: decoded rest_data of the call.
+        :return: the response of the call.
+        :rtype: object
+        """
+        delay = self.latency + self._random.random() * self.latency_jitter
+        if delay:
+            time.sleep(delay)
+        with self._lock:
+            self.calls.append(method)
+            for i, (failing_method, number) in enumerate(self._failures):
+                if failing_method in (None, method):
+                    del self._failures[i]
+                    return self._error(number)
+            if method != 'login' and self.error_rate and self._random.random() < self.error_rate:
+                return self._error(self.error_number)
+            if method == 'login':
+                return self._login(parameters)
+            if parameters.get('session') not in self._sessions:
+                return self._error(11)
+            if method not in self.METHODS:
+                return self._error(1000)
+            return getattr(self, '_' + method)(parameters)
+
+    @staticmethod
+    def _error(number):
+        name, description = ERRORS.get(number, ('Unknown error', 'Unknown error'))
+        return OrderedDict([('name', name), ('description', description), ('number', number)])
+
+    def _login(self, parameters):
+        user_auth = parameters.get('user_auth', {})
+        if (user_auth.get('user_name') != self.username
+                or user_auth.get('password') != hashlib.md5(self.password).hexdigest()):
+            return self._error(10)
+        session_id = uuid.uuid4().hex
+        self._sessions.add(session_id)
+        return {'id': session_id, 'module_name': 'Users', 'name_value_list': {}}
+
+    def _module(self, module_name):
+        if module_name not in self._modules:
+            return None
+        return self._modules[module_name]
+
+    @staticmethod
+    def _name_value_list(record, select_fields):
+        name_value_list = OrderedDict()
+        for name, value in record.items():
+            if not select_fields or name in select_fields:
+                name_value_list[name] = {'name': name, 'value': value}
+        return name_value_list
+
+    def _entry(self, module_name, record, select_fields):
+        return {
+            'id': record['id'],
+            'module_name': module_name,
+            'name_value_list': self._name_value_list(record, select_fields)
+        }
+
+    @staticmethod
+    def _warning_entry(module_name, id):
+        return {
+            'id': id,
+            'module_name': module_name,
+            'name_value_list': [
+                {'name': 'warning', 'value': 'Access to this object is denied since it has been deleted or does not exist'},
+                {'name': 'deleted', 'value': '1'}
+            ]
+        }
+
+    def _link_list(self, module_name, id, link_name_to_fields_array):
+        link_list = []
+        for link in link_name_to_fields_array or []:
+            records = []
+            for related_module, related_id in self._relationships.get((module_name, id, link['name']), []):
+                record = self._modules.get(related_module, {}).get(related_id)
+                if record is not None:
+                    records.append(self._name_value_list(record, link.get('value')))
+            link_list.append({'name': link['name'], 'records': records})
+        return link_list
+
+    def _get_entry(self, parameters):
+        return self._get_entries(dict(parameters, ids=[parameters['id']]))
+
+    def _get_entries(self, parameters):
+        module_name = parameters['module_name']
+        module = self._module(module_name)
+        if module is None:
+            return self._error(20)
+        entry_list = []
+        relationship_list = []
+        for id in parameters['ids']:
+            record = module.get(id)
+            if record is None or record.get('deleted') == '1':
+                entry_list.append(self._warning_entry(module_name, id))
+                relationship_list.append([])
+                continue
+            entry_list.append(self._entry(module_name, record, parameters.get('select_fields')))
+            relationship_list.append(
+                self._link_list(module_name, id, parameters.get('link_name_to_fields_array')))
+        return {'entry_list': entry_list, 'relationship_list': relationship_list}
+
+    def _query(self, module_name, query, order_by, deleted):
+        records = self._module(module_name).values()
+        if not deleted:
+            records = [record for record in records if record.get('deleted') != '1']
+        if query:
+            condition = QueryParser(query).parse()
+            records = [record for record in records if condition(record)]
+        return sort_records(records, order_by)
+
+    @staticmethod
+    def _int(value, default):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return default
+
+    def _get_entry_list(self, parameters):
+        module_name = parameters['module_name']
+        if self._module(module_name) is None:
+            return self._error(20)
+        records = self._query(module_name, parameters.get('query'),
+                              parameters.get('order_by'), parameters.get('deleted'))
+        offset = self._int(parameters.get('offset'), 0)
+        max_results = self._int(parameters.get('max_results'), self.max_page_size)
+        page = records[offset:offset + min(max_results, self.max_page_size)]
+        return {
+            'result_count': len(page),
+            'total_count': str(len(records)),
+            'next_offset': offset + len(page),
+            'entry_list': [self._entry(module_name, record, parameters.get('select_fields'))
+                           for record in page],
+            'relationship_list': [
+                self._link_list(module_name, record['id'],
+                                parameters.get('link_name_to_fields_array'))
+                for record in page
+            ] if parameters.get('link_name_to_fields_array') else []
+        }
+
+    def _get_entries_count(self, parameters):
+        module_name = parameters['module_name']
+        if self._module(module_name) is None:
+            return self._error(20)
+        records = self._query(module_name, parameters.get('query'), '', parameters.get('deleted'))
+        return {'result_count': len(records)}
+
+    def _set_entry(self, parameters):
+        module_name = parameters['module_name']
+        if self._module(module_name) is None:
+            return self._error(20)
+        fields = self._fields(parameters['name_value_list'])
+        record = self._modules[module_name].get(fields.get('id'))
+        if record is None:
+            record = self._modules[module_name][self.add_bean(module_name, fields)]
+        else:
+            record.update(fields)
+        return {'id': record['id'], 'entry_list': self._name_value_list(record, list(fields))}
+
+    def _set_entries(self, parameters):
+        ids = []
+        for name_value_list in parameters['name_value_lists']:
+            result = self._set_entry({'module_name': parameters['module_name'],
+                                      'name_value_list': name_value_list})
+            if 'id' not in result:
+                return result
+            ids.append(result['id'])
+        return {'ids': ids}
+
+    @staticmethod
+    def _fields(name_value_list):
+        if isinstance(name_value_list, dict):
+            name_value_list = name_value_list.values()
+        return dict((item['name'], item['value']) for item in name_value_list)
+
+    def _get_relationships(self, parameters):
+        module_name = parameters['module_name']
+        if self._module(module_name) is None:
+            return self._error(20)
+        related = self._relationships.get(
+            (module_name, parameters['module_id'], parameters['link_field_name']), [])
+        records = []
+        for related_module, related_id in related:
+            record = self._modules.get(related_module, {}).get(related_id)
+            if record is not None and (parameters.get('deleted') or record.get('deleted') != '1'):
+                records.append((related_module, record))
+        query = parameters.get('related_module_query')
+        if query:
+            condition = QueryParser(query).parse()
+            records = [item for item in records if condition(item[1])]
+        offset = self._int(parameters.get('offset'), 0)
+        limit = self._int(parameters.get('limit'), len(records))
+        page = records[offset:offset + limit]
+        return {
+            'entry_list': [self._entry(related_module, record, parameters.get('related_fields'))
+                           for related_module, record in page],
+            'relationship_list': [
+                self._link_list(related_module, record['id'],
+                                parameters.get('related_module_link_name_to_fields_array'))
+                for related_module, record in page
+            ]
+        }
+
+    def _set_relationship(self, parameters):
+        return self._set_relationships({
+            'module_names': [parameters['module_name']],
+            'module_ids': [parameters['module_id']],
+            'link_field_names': [parameters['link_field_name']],
+            'related_ids': [parameters['related_ids']],
+            'delete_array': [parameters.get('delete')]
+        })
+
+    def _set_relationships(self, parameters):
+        result = {'created': 0, 'failed': 0, 'deleted': 0}
+        delete_array = parameters.get('delete_array') or []
+        for i, module_name in enumerate(parameters['module_names']):
+            module_id = parameters['module_ids'][i]
+            key = (module_name, module_id, parameters['link_field_names'][i])
+            related_ids = parameters['related_ids'][i]
+            if not isinstance(related_ids, list):
+                related_ids = [related_ids]
+            if module_id not in self._modules.get(module_name, {}):
+                result['failed'] += len(related_ids)
+                continue
+            related = self._relationships.setdefault(key, [])
+            for related_id in related_ids:
+                related_module = self._find_module(related_id)
+                if related_module is None:
+                    result['failed'] += 1
+                elif len(delete_array) > i and delete_array[i]:
+                    if (related_module, related_id) in related:
+                        related.remove((related_module, related_id))
+                    result['deleted'] += 1
+                else:
+                    if (related_module, related_id) not in related:
+                        related.append((related_module, related_id))
+                    result['created'] += 1
+        return result
+
+    def _find_module(self, id):
+        for module_name, records in self._modules.items():
+            if id in records:
+                return module_name
+        return None
+
+    def _set_note_attachment(self, parameters):
+        note = parameters['note']
+        if note['id'] not in self._modules.get('Notes', {}):
+            self.add_bean('Notes', {'id': note['id'], 'name': note['filename']})
+        self._attachments[note['id']] = (note['filename'], note['file'])
+        self._modules['Notes'][note['id']]['filename'] = note['filename']
+        return {'id': note['id']}
+
+    def _get_note_attachment(self, parameters):
+        filename, file = self._attachments.get(parameters['id'], ('', ''))
+        return {'note_attachment': OrderedDict([
+            ('id', parameters['id']),
+            ('filename', filename),
+            ('file', file),
+            ('related_module_id', ''),
+            ('related_module_name', '')
+        ])}
+
+    def _get_pdf_template(self, parameters):
+        record = self._modules.get(parameters['bean_module'], {}).get(parameters['bean_id'])
+        if record is None:
+            return self._error(40)
+        content = '%PDF-1.4\n' + json.dumps(record) + '\n%%EOF\n'
+        return {'file': base64.b64encode(content)}
+
+    def _get_module_fields(self, parameters):
+        module = self._module(parameters['module_name'])
+        if module is None:
+            return self._error(20)
+        names = set()
+        for record in module.values():
+            names.update(record.keys())
+        return {
+            'module_name': parameters['module_name'],
+            'module_fields': dict((name, {'name': name, 'type': 'varchar', 'label': name})
+                                  for name in sorted(names)
+                                  if not parameters.get('fields') or name in parameters['fields']),
+            'link_fields': {}
+        }
+
+    def _get_available_modules(self, parameters):
+        return {'modules': [{'module_key': name, 'module_label': name, 'favorite_enabled': False,
+                             'acls': []} for name in self._modules]}
+
+
+class QueryParser(object):
+    """
+    This class compiles the subset of SQL WHERE clauses supported by MockSuiteCRM
+    into a function that evaluates a record.
+    """
+
+    _TOKEN = re.compile(r"\s*(?:(\(|\)|,)|('(?:[^']|'')*')|(<=|>=|<>|!=|=|<|>)|"
+                        r"(-?\d+(?:\.\d+)?)(?![\w.])|([A-Za-z_][\w.]*))")
+
+    def __init__(self, query):
+        self._tokens = []
+        position = 0
+        query = query.strip()
+        while position < len(query):
+            match = self._TOKEN.match(query, position)
+            if not match or match.end() == position:
+                raise ValueError('Unsupported query: ' + query)
+            position = match.end()
+            punctuation, string, operator, number, identifier = match.groups()
+            if string is not None:
+                self._tokens.append(('value', string[1:-1].replace("''", "'")))
+            elif number is not None:
+                self._tokens.append(('value', number))
+            elif identifier is not None:
+                keyword = identifier.upper()
+                if keyword in ('AND', 'OR', 'NOT', 'LIKE', 'IN', 'IS', 'NULL'):
+                    self._tokens.append((keyword, keyword))
+                else:
+                    self._tokens.append(('field', identifier.split('.')[-1]))
+            else:
+                self._tokens.append((punctuation or operator, punctuation or operator))
+        self._position = 0
+
+    def _peek(self):
+        if self._position < len(self._tokens):
+            return self._tokens[self._position][0]
+        return None
+
+    def _next(self):
+        token = self._tokens[self._position]
+        self._position += 1
+        return token
+
+    def _expect(self, kind):
+        if self._peek() != kind:
+            raise ValueError('Expected %s in query' % kind)
+        return self._next()
+
+    def parse(self):
+        """
+        Compile the query.
+
+        :return: function that receives a record and returns whether it matches the query.
+        :rtype: function
+        """
+        condition = self._or()
+        if self._peek() is not None:
+            raise ValueError('Unexpected token in query')
+        return condition
+
+    def _or(self):
+        conditions = [self._and()]
+        while self._peek() == 'OR':
+            self._next()
+            conditions.append(self._and())
+        return lambda record: any(condition(record) for condition in conditions)
+
+    def _and(self):
+        conditions = [self._not()]
+        while self._peek() == 'AND':
+            self._next()
+            conditions.append(self._not())
+        return lambda record: all(condition(record) for condition in conditions)
+
+    def _not(self):
+        if self._peek() == 'NOT':
+            self._next()
+            condition = self._not()
+            return lambda record: not condition(record)
+        if self._peek() == '(':
+            self._next()
+            condition = self._or()
+            self._expect(')')
+            return condition
+        return self._comparison()
+
+    def _operand(self):
+        kind, value = self._next()
+        if kind == 'field':
+            return lambda record: record.get(value)
+        if kind == 'value':
+            return lambda record: value
+        raise ValueError('Expected field or value in query')
+
+    def _comparison(self):
+        left = self._operand()
+        kind = self._peek()
+        if kind == 'IS':
+            self._next()
+            negate = self._peek() == 'NOT'
+            if negate:
+                self._next()
+            self._expect('NULL')
+            return lambda record: (left(record) in (None, '')) != negate
+        negate = kind == 'NOT'
+        if negate:
+            self._next()
+            kind = self._peek()
+        if kind == 'LIKE':
+            self._next()
+            pattern = self._operand()({})
+            regex = re.compile('^' + re.escape(pattern).replace('\\%', '.*').replace('\\_', '.') + '$',
+                               re.IGNORECASE | re.DOTALL)
+            return lambda record: bool(regex.match(unicode(left(record) or ''))) != negate
+        if kind == 'IN':
+            self._next()
+            self._expect('(')
+            values = [self._operand()({})]
+            while self._peek() == ',':
+                self._next()
+                values.append(self._operand()({}))
+            self._expect(')')
+            return lambda record: (left(record) in values) != negate
+        operator = self._next()[0]
+        right = self._operand()
+        compare = {
+            '=': lambda a, b: a == b,
+            '!=': lambda a, b: a != b,
+            '<>': lambda a, b: a != b,
+            '<': lambda a, b: a < b,
+            '>': lambda a, b: a > b,
+            '<=': lambda a, b: a <= b,
+            '>=': lambda a, b: a >= b
+        }.get(operator)
+        if compare is None:
+            raise ValueError('Unsupported operator in query: ' + operator)
+        return lambda record: compare(*_comparable(left(record), right(record)))
+
+
+def _comparable(a, b):
+    try:
+        return float(a), float(b)
+    except (TypeError, ValueError):
+        return unicode(a if a is not None else ''), unicode(b if b is not None else '')
+
+
+def sort_records(records, order_by):
+    """
+    Sort records using a SQL ORDER BY clause.
+
+    :param list[dict] records: records to sort.
+    :param str order_by: SQL ORDER BY clause without the phrase 'ORDER BY'.
+    :return: sorted records.
+    :rtype: list[dict]
+    """
+    records = list(records)
+    if not order_by:
+        return records
+    for clause in reversed([clause.split() for clause in order_by.split(',') if clause.strip()]):
+        field = clause[0].split('.')[-1]
+        descending = len(clause) > 1 and clause[1].upper() == 'DESC'
+        records.sort(key=lambda record: record.get(field) or '', reverse=descending)
+    return records
+
+
+class _ThreadingHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class _RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        mock = self.server.mock
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+        content_type, options = cgi.parse_header(self.headers.get('Content-Type', ''))
+        if content_type == 'multipart/form-data':
+            form = cgi.parse_multipart(StringIO(body), options)
+        else:
+            form = urlparse.parse_qs(body)
+        method = form.get('method', [''])[0]
+        try:
+            parameters = json.loads(form.get('rest_data', ['null'])[0],
+                                    object_pairs_hook=OrderedDict) or {}
+            response = json.dumps(mock.handle(method, parameters))
+        except (ValueError, KeyError, TypeError):
+            response = 'null'
+        response = response.replace('/', '\\/')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+
+class MockSuiteCRMServer(object):
+    """
+    This class serves a MockSuiteCRM instance over HTTP on a local port,
+    emulating the rest.php endpoint.
+
+    It can be used as a context manager that starts and stops the server.
+    """
+
+    def __init__(self, mock=None, host='127.0.0.1', port=0):
+        """
+        Creates a MockSuiteCRMServer instance.
+
+        :param MockSuiteCRM mock: mock API to serve, a new one is created if not specified.
+        :param str host: address to listen on.
+        :param int port: port to listen on, 0 to choose a free port.
+        """
+        self.mock = mock or MockSuiteCRM()
+        self._server = _ThreadingHTTPServer((host, port), _RequestHandler)
+        self._server.mock = self.mock
+        self._thread = None
+
+    @property
+    def url(self):
+        """
+        Get the URL of the emulated rest.php endpoint.
+
+        :return: URL of the endpoint.
+        :rtype: str
+        """
+        host, port = self._server.server_address
+        return 'http://%s:%d/service/v4_1/rest.php' % (host, port)
+
+    def start(self):
+        """
+        Start serving requests on a background thread.
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop serving requests.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
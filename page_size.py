@@ -0,0 +1,204 @@
+#######################################################################
+# Suite PY is a simple Python client for SuiteCRM API.
+
+# Copyright (C) 2017-2018 BTACTIC, SCCL
+# Copyright (C) 2017-2018 Marc Sanchez Fauste
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#######################################################################
+
+import socket
+import threading
+import time
+
+from suite_exceptions import ResourceManagementErrorException
+
+# Errors that may be caused by the size of a page: HTTP errors and timeouts
+# (requests exceptions are IOErrors), truncated responses and query limits.
+# Only some of them are, see is_page_size_error.
+RETRYABLE_ERRORS = (IOError, ValueError, ResourceManagementErrorException)
+
+
+def is_page_size_error(error):
+    """
+    Check whether a page may succeed with less records after failing with an error:
+    a read timeout, a server error, a truncated response or a query limit. Connection
+    errors and client errors don't depend on the size of the page.
+
+    :param Exception error: the error of the page.
+    :return: True if a smaller page may avoid the error, False otherwise.
+    :rtype: bool
+    """
+    if isinstance(error, ResourceManagementErrorException):
+        return True
+    if isinstance(error, IOError):
+        response = getattr(error, 'response', None)
+        if response is not None:
+            return response.status_code >= 500
+        import requests
+        if isinstance(error, requests.ConnectionError):
+            return False
+        return isinstance(error, (requests.Timeout, requests.exceptions.ChunkedEncodingError,
+                                  socket.timeout))
+    return isinstance(error, ValueError)
+
+
+class PageSizeController(object):
+    """
+    This class tunes the number of records requested on each page of the paginated
+    iterations, like SuiteCRM.iter_bean_list and SuiteCRM.iter_relationships.
+
+    The page size of each module grows while pages are retrieved faster than the
+    target latency, and shrinks proportionally when they are slower or their
+    responses are larger than max_response_bytes. When a page fails with an error
+    that a smaller page may avoid, like a PHP memory or time limit, it is retried
+    with half the records, and the page size of the module won't grow again
+    beyond 90% of the failed size for ceiling_ttl seconds. Other errors, like
+    connection errors, are raised without changing the page size. Tuned sizes are
+    kept for the rest of the process.
+    """
+
+    def __init__(self, initial=100, minimum=10, maximum=1000, target_latency=1.0,
+                 max_response_bytes=8 * 1024 * 1024, growth=1.5, ceiling_ttl=600):
+        """
+        Creates a PageSizeController instance.
+
+        :param int initial: page size of the modules without observations.
+        :param int minimum: minimum page size.
+        :param int maximum: maximum page size.
+        :param float target_latency: target seconds to retrieve a page.
+        :param int max_response_bytes: maximum size of the responses.
+        :param float growth: factor applied to the page size when pages are fast.
+        :param float ceiling_ttl: seconds the page size is kept below the size of a failed page.
+        """
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.max_response_bytes = max_response_bytes
+        self.growth = growth
+        self.ceiling_ttl = ceiling_ttl
+        self._lock = threading.Lock()
+        self._sizes = {}
+        self._ceilings = {}
+        self._responses = threading.local()
+
+    def get_page_size(self, key):
+        """
+        Get the current page size of a module.
+
+        :param str key: name of the module, or of the module and the link for relationships.
+        :return: the page size.
+        :rtype: int
+        """
+        with self._lock:
+            return self._sizes.get(key, self.initial)
+
+    def get_page_sizes(self):
+        """
+        Get the tuned page sizes.
+
+        :return: dict with the page size of each module.
+        :rtype: dict[str, int]
+        """
+        with self._lock:
+            return dict(self._sizes)
+
+    def _set_page_size(self, key, size):
+        with self._lock:
+            size = int(max(self.minimum, min(self._get_ceiling(key), size)))
+            self._sizes[key] = size
+        return size
+
+    def _get_ceiling(self, key):
+        ceiling = self._ceilings.get(key)
+        if ceiling is None:
+            return self.maximum
+        if ceiling[1] <= time.time():
+            del self._ceilings[key]
+            return self.maximum
+        return ceiling[0]
+
+    def record_response(self, response_bytes):
+        """
+        Record the size of the last response received by the current thread.
+
+        :param int response_bytes: bytes of the response.
+        """
+        self._responses.last = response_bytes
+
+    def observe(self, key, page_size, latency, response_bytes=None, result_count=None):
+        """
+        Adjust the page size of a module after retrieving a page.
+
+        :param str key: name of the module, or of the module and the link for relationships.
+        :param int page_size: number of records requested.
+        :param float latency: seconds spent retrieving the page.
+        :param int response_bytes: bytes of the response.
+        :param int result_count: number of records returned.
+        :return: the new page size.
+        :rtype: int
+        """
+        if response_bytes and response_bytes > self.max_response_bytes:
+            size = page_size * 0.9 * self.max_response_bytes / response_bytes
+        elif latency > self.target_latency:
+            size = max(page_size / 2.0, page_size * self.target_latency / latency)
+        elif latency < self.target_latency / 2 and (result_count is None or result_count >= page_size):
+            size = page_size * self.growth
+            if response_bytes:
+                size = min(size, page_size * 0.9 * self.max_response_bytes / response_bytes)
+        else:
+            size = page_size
+        return self._set_page_size(key, size)
+
+    def failed(self, key, page_size):
+        """
+        Shrink the page size of a module after a page failed.
+
+        :param str key: name of the module, or of the module and the link for relationships.
+        :param int page_size: number of records requested.
+        :return: the new page size.
+        :rtype: int
+        """
+        with self._lock:
+            self._ceilings[key] = (min(self._get_ceiling(key), int(page_size * 0.9)),
+                                   time.time() + self.ceiling_ttl)
+        return self._set_page_size(key, page_size // 2)
+
+    def fetch(self, key, fetch_page):
+        """
+        Retrieve a page with the page size of a module, and adjust it. Pages failing with
+        an error that a smaller page may avoid are retried with half the records, until
+        the minimum page size also fails.
+
+        :param str key: name of the module, or of the module and the link for relationships.
+        :param function fetch_page: function that receives a page size and returns a page
+            as a dict containing at least the result_count key.
+        :return: the page.
+        :rtype: dict[str, object]
+        """
+        size = self.get_page_size(key)
+        while True:
+            self._responses.last = None
+            start = time.time()
+            try:
+                page = fetch_page(size)
+            except RETRYABLE_ERRORS as e:
+                if size <= self.minimum or not is_page_size_error(e):
+                    raise
+                size = self.failed(key, size)
+                continue
+            self.observe(key, size, time.time() - start, self._responses.last,
+                         page.get('result_count'))
+            return page
@@ -0,0 +1,94 @@
+#######################################################################
+# Suite PY is a simple Python client for SuiteCRM API.
+
+# Copyright (C) 2017-2018 BTACTIC, SCCL
+# Copyright (C) 2017-2018 Marc Sanchez Fauste
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#######################################################################
+
+import threading
+from Queue import Queue, Full
+
+
+def iter_pages(fetch_page, offset=0, prefetch=1):
+    """
+    Iterate over the pages of a paginated request.
+
+    Pages are retrieved calling fetch_page with the offset of the page, and the
+    iteration follows the next_offset of each page until it is None. The offset can
+    be any value understood by fetch_page, like the key of the last record of the
+    previous page on keyset pagination.
+    When prefetch is greater than 0, the following pages are retrieved on a
+    background thread while the current page is being consumed, keeping at most
+    prefetch pages waiting in memory.
+
+    :param function fetch_page: function that receives an offset and returns a page
+        as a dict containing at least the next_offset key.
+    :param int offset: offset of the first page.
+    :param int prefetch: maximum number of pages retrieved in advance.
+    :return: generator of pages.
+    :rtype: generator
+    """
+    if prefetch <= 0:
+        while offset is not None:
+            page = fetch_page(offset)
+            yield page
+            offset = page['next_offset']
+        return
+    prefetcher = _PagePrefetcher(fetch_page, offset, prefetch)
+    prefetcher.start()
+    try:
+        while True:
+            page, error = prefetcher.pages.get()
+            if error is not None:
+                raise error
+            if page is None:
+                return
+            yield page
+    finally:
+        prefetcher.stop()
+
+
+class _PagePrefetcher(threading.Thread):
+
+    def __init__(self, fetch_page, offset, prefetch):
+        super(_PagePrefetcher, self).__init__()
+        self.daemon = True
+        self.pages = Queue(maxsize=prefetch)
+        self._fetch_page = fetch_page
+        self._offset = offset
+        self._stopped = threading.Event()
+
+    def run(self):
+        offset = self._offset
+        try:
+            while offset is not None and not self._stopped.is_set():
+                page = self._fetch_page(offset)
+                self._put((page, None))
+                offset = page['next_offset']
+            self._put((None, None))
+        except Exception as e:
+            self._put((None, e))
+
+    def _put(self, item):
+        while not self._stopped.is_set():
+            try:
+                self.pages.put(item, timeout=0.1)
+                return
+            except Full:
+                pass
+
+    def stop(self):
+        self._stopped.set()
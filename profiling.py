@@ -0,0 +1,340 @@
+#######################################################################
+# Suite PY is a simple Python client for SuiteCRM API.
+
+# Copyright (C) 2017-2018 BTACTIC, SCCL
+# Copyright (C) 2017-2018 Marc Sanchez Fauste
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#######################################################################
+
+import atexit
+import functools
+import os
+import sys
+import threading
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# ru_maxrss is in kilobytes, except on macOS where it is in bytes.
+_MAXRSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+
+def _get_max_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAXRSS_UNIT
+
+_cpu_time = getattr(time, 'process_time', None) or time.clock
+
+
+def _get_phases():
+    from bean import Bean
+    from suitecrm import SuiteCRM
+    from suitecrm_cached import SuiteCRMCached
+    return [
+        ('call', SuiteCRM, '_call'),
+        ('json_decode', SuiteCRM, '_decode_response'),
+        ('bean_fields', Bean, '_set_name_value_list'),
+        ('bean_relationships', Bean, '_set_relationship_list'),
+        ('cache_key', SuiteCRMCached, '_get_cache_key'),
+    ]
+
+
+class Profiler(object):
+    """
+    This class profiles the hot paths of the client: API calls, JSON decoding,
+    Bean construction and cache key building.
+
+    In deterministic mode the profiled functions are wrapped to measure the wall
+    time, CPU time and memory of each phase. Memory is the bytes allocated when
+    tracemalloc is available (Python 3), or else the growth of the peak resident
+    memory of the process (ru_maxrss), which shows the phases that make the process
+    grow but not the memory reused from previous calls. Phases are inclusive: the
+    call phase includes the JSON decoding.
+    CPU time is measured for the whole process, so it is only accurate when the
+    client is used from a single thread.
+
+    In sampling mode a background thread periodically inspects the stacks of
+    all threads and counts the samples found inside each phase.
+    """
+
+    def __init__(self, mode='deterministic', interval=0.005):
+        """
+        Creates a Profiler instance.
+
+        :param str mode: deterministic or sampling.
+        :param float interval: seconds between samples in sampling mode.
+        """
+        if mode not in ('deterministic', 'sampling'):
+            raise ValueError('Unknown profiling mode: ' + mode)
+        self.mode = mode
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._originals = []
+        self._sampler = None
+        self._codes = {}
+        self._stopped = threading.Event()
+        self._started_tracemalloc = False
+        self._memory = None
+        self.reset()
+
+    def reset(self):
+        """
+        Discard the collected statistics.
+        """
+        with self._lock:
+            self._stats = {}
+            self._samples = 0
+            self._start_time = time.time()
+
+    def _phase_stats(self, phase):
+        stats = self._stats.get(phase)
+        if stats is None:
+            stats = self._stats[phase] = {
+                'calls': 0,
+                'wall_seconds': 0.0,
+                'cpu_seconds': 0.0,
+                'allocated_bytes': 0,
+                'samples': 0
+            }
+        return stats
+
+    def start(self):
+        """
+        Start profiling.
+        """
+        if self._originals or self._sampler:
+            return
+        phases = _get_phases()
+        if self.mode == 'deterministic':
+            if tracemalloc is not None and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracemalloc = True
+            if tracemalloc is not None and tracemalloc.is_tracing():
+                self._memory = 'tracemalloc'
+            elif resource is not None:
+                self._memory = 'maxrss'
+            for phase, cls, name in phases:
+                original = cls.__dict__[name]
+                self._originals.append((cls, name, original))
+                setattr(cls, name, self._wrap(phase, original))
+        else:
+            self._codes = dict((self._unwrap(cls.__dict__[name]).__code__, phase)
+                               for phase, cls, name in phases)
+            self._stopped.clear()
+            self._sampler = threading.Thread(target=self._sample)
+            self._sampler.daemon = True
+            self._sampler.start()
+
+    def stop(self):
+        """
+        Stop profiling, keeping the collected statistics.
+        """
+        for cls, name, original in self._originals:
+            setattr(cls, name, original)
+        self._originals = []
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        if self._sampler is not None:
+            self._stopped.set()
+            self._sampler.join()
+            self._sampler = None
+
+    @staticmethod
+    def _unwrap(function):
+        return function.__func__ if isinstance(function, staticmethod) else function
+
+    def _wrap(self, phase, original):
+        function = self._unwrap(original)
+        get_memory = self._get_memory
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            memory = get_memory()
+            cpu = _cpu_time()
+            wall = time.time()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                wall = time.time() - wall
+                cpu = _cpu_time() - cpu
+                memory = get_memory() - memory
+                with self._lock:
+                    stats = self._phase_stats(phase)
+                    stats['calls'] += 1
+                    stats['wall_seconds'] += wall
+                    stats['cpu_seconds'] += cpu
+                    stats['allocated_bytes'] += max(0, memory)
+
+        if isinstance(original, staticmethod):
+            return staticmethod(wrapper)
+        return wrapper
+
+    def _get_memory(self):
+        if self._memory == 'tracemalloc':
+            return tracemalloc.get_traced_memory()[0]
+        if self._memory == 'maxrss':
+            return _get_max_rss()
+        return 0
+
+    def _sample(self):
+        while not self._stopped.wait(self._interval):
+            frames = sys._current_frames()
+            found = set()
+            for thread_id, frame in frames.items():
+                if thread_id == threading.current_thread().ident:
+                    continue
+                while frame is not None:
+                    phase = self._codes.get(frame.f_code)
+                    if phase is not None:
+                        found.add(phase)
+                    frame = frame.f_back
+            with self._lock:
+                self._samples += 1
+                for phase in found:
+                    self._phase_stats(phase)['samples'] += 1
+
+    def report(self):
+        """
+        Get the collected statistics.
+
+        :return: dict with the profiling mode, the elapsed seconds, the number
+            of samples, how memory is measured (tracemalloc, maxrss or None)
+            and the statistics of each phase.
+        :rtype: dict[str, object]
+        """
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "seconds": time.time() - self._start_time,
+                "samples": self._samples,
+                "tracemalloc": self._started_tracemalloc,
+                "memory": self._memory,
+                "phases": dict((phase, dict(stats)) for phase, stats in self._stats.items())
+            }
+
+    def format_report(self):
+        """
+        Get the collected statistics as a text table.
+
+        :return: text report.
+        :rtype: str
+        """
+        report = self.report()
+        lines = ['SuitePY profile (%s mode, %.3f s)' % (report['mode'], report['seconds'])]
+        if report['mode'] == 'deterministic':
+            lines.append('%-20s %10s %12s %12s %14s' % (
+                'phase', 'calls', 'wall s', 'cpu s',
+                'peak rss KB' if report['memory'] == 'maxrss' else 'allocated KB'))
+            for phase, stats in sorted(report['phases'].items()):
+                lines.append('%-20s %10d %12.6f %12.6f %14.1f' % (
+                    phase, stats['calls'], stats['wall_seconds'], stats['cpu_seconds'],
+                    stats['allocated_bytes'] / 1024.0))
+        else:
+            lines.append('%-20s %10s %8s' % ('phase', 'samples', '%'))
+            for phase, stats in sorted(report['phases'].items()):
+                lines.append('%-20s %10d %7.1f%%' % (
+                    phase, stats['samples'], 100.0 * stats['samples'] / max(1, report['samples'])))
+        return '\n'.join(lines) + '\n'
+
+    def write_report(self, output=None):
+        """
+        Write the collected statistics as a text table.
+
+        :param output: path of the file or file object where the report is written,
+            by default the standard error.
+        """
+        if output is None:
+            sys.stderr.write(self.format_report())
+        elif isinstance(output, basestring):
+            with open(output, 'a') as f:
+                f.write(self.format_report())
+        else:
+            output.write(self.format_report())
+
+
+_profiler = None
+
+
+def get_profiler():
+    """
+    Get the active profiler.
+
+    :return: the active profiler or None.
+    :rtype: Profiler
+    """
+    return _profiler
+
+
+def start(mode='deterministic', output=None, report_on_exit=True):
+    """
+    Start profiling the client hot paths.
+
+    :param str mode: deterministic or sampling.
+    :param str output: path of the file where the report is written on exit,
+        by default the standard error.
+    :param bool report_on_exit: write the report when the process exits.
+    :return: the active profiler.
+    :rtype: Profiler
+    """
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler(mode)
+        _profiler.start()
+        if report_on_exit:
+            atexit.register(_profiler.write_report, output)
+        atexit.register(_profiler.stop)
+    return _profiler
+
+
+def stop():
+    """
+    Stop profiling the client hot paths.
+
+    :return: the stopped profiler, which keeps the collected statistics.
+    :rtype: Profiler
+    """
+    global _profiler
+    profiler = _profiler
+    if profiler is not None:
+        profiler.stop()
+        _profiler = None
+    return profiler
+
+
+def start_from_config(conf=None):
+    """
+    Start profiling if it is enabled by the SUITEPY_PROFILE environment variable
+    or the profile option of the config. Valid values are deterministic, sampling,
+    or any other non-empty value for the deterministic mode. The report is written
+    on exit to the file specified by SUITEPY_PROFILE_OUTPUT or to the standard error.
+
+    :param Config conf: config of the client.
+    :return: the active profiler or None.
+    :rtype: Profiler
+    """
+    mode = os.environ.get('SUITEPY_PROFILE') or (conf.profile if conf is not None else None)
+    if not mode or mode.lower() in ('0', 'false', 'no', 'off'):
+        return _profiler
+    if mode not in ('deterministic', 'sampling'):
+        mode = 'deterministic'
+    return start(mode, os.environ.get('SUITEPY_PROFILE_OUTPUT'))
@@ -0,0 +1,114 @@
+#######################################################################
+# Suite PY is a simple Python client for SuiteCRM API.
+
+# Copyright (C) 2017-2018 BTACTIC, SCCL
+# Copyright (C) 2017-2018 Marc Sanchez Fauste
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#######################################################################
+
+import threading
+
+
+class FieldProjection(object):
+    """
+    This class records which fields of the returned Beans are read at each call site.
+
+    During the warm up calls of a call site all the fields are retrieved. Once the
+    call site is warmed up, only the fields that have been read are requested to SuiteCRM.
+    If a projected Bean is asked for a field that was not retrieved, the full Bean
+    is retrieved and the field is added to the projection of its call site.
+    """
+
+    def __init__(self, warm_up_calls=3):
+        """
+        Creates a FieldProjection instance.
+
+        :param int warm_up_calls: number of calls of each call site that retrieve all the fields.
+        """
+        self._warm_up_calls = warm_up_calls
+        self._call_counts = {}
+        self._used_fields = {}
+        self._lock = threading.Lock()
+
+    def get_select_fields(self, call_site):
+        """
+        Get the fields that must be retrieved for a call site.
+
+        :param tuple call_site: identifier of the call site.
+        :return: list of fields to retrieve, or empty string to retrieve all the fields.
+        :rtype: list[str]
+        """
+        with self._lock:
+            calls = self._call_counts.get(call_site, 0)
+            self._call_counts[call_site] = calls + 1
+            if calls < self._warm_up_calls:
+                return ''
+            fields = set(self._used_fields.get(call_site, ()))
+        fields.add('id')
+        return sorted(fields)
+
+    def track(self, call_site, bean, select_fields, full_fetch):
+        """
+        Start recording the fields read from a Bean.
+
+        :param tuple call_site: identifier of the call site that retrieved the Bean.
+        :param Bean bean: Bean to track.
+        :param list[str] select_fields: fields retrieved for the Bean, empty if all fields were retrieved.
+        :param function full_fetch: function that returns the Bean with all its fields.
+        """
+        bean._access_hook = _ProjectedBeanHook(self, call_site, select_fields, full_fetch)
+
+    def _field_used(self, call_site, field_name):
+        with self._lock:
+            self._used_fields.setdefault(call_site, set()).add(field_name)
+
+    def get_projected_fields(self):
+        """
+        Get the fields that have been read on each call site.
+
+        :return: dictionary with the call sites and its read fields.
+        :rtype: dict[tuple, list[str]]
+        """
+        with self._lock:
+            return dict((call_site, sorted(fields))
+                        for call_site, fields in self._used_fields.items())
+
+    def reset(self):
+        """
+        Forget all recorded call sites, so they will be warmed up again.
+        """
+        with self._lock:
+            self._call_counts.clear()
+            self._used_fields.clear()
+
+
+class _ProjectedBeanHook(object):
+
+    def __init__(self, projection, call_site, select_fields, full_fetch):
+        self._projection = projection
+        self._call_site = call_site
+        self._select_fields = set(select_fields) if select_fields else None
+        self._full_fetch = full_fetch
+
+    def __call__(self, bean, field_name):
+        if field_name in bean._relationship_list:
+            return
+        self._projection._field_used(self._call_site, field_name)
+        if self._select_fields is not None and field_name not in self._select_fields:
+            self._select_fields = None
+            full_bean = self._full_fetch()
+            for name, value in full_bean._fields.items():
+                if name not in bean._fields:
+                    bean._fields[name] = value
@@ -0,0 +1,139 @@
+#######################################################################
+# Suite PY is a simple Python client for SuiteCRM API.
+
+# Copyright (C) 2017-2018 BTACTIC, SCCL
+# Copyright (C) 2017-2018 Marc Sanchez Fauste
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#######################################################################
+
+import json
+import threading
+import urllib
+import uuid
+import zlib
+from collections import OrderedDict
+
+FORM_CONTENT_TYPE = 'application/x-www-form-urlencoded'
+
+
+class RequestEncoder(object):
+    """
+    This class encodes the form fields of the requests sent to SuiteCRM.
+
+    Small requests are url-encoded. Larger ones are sent as multipart/form-data,
+    which PHP parses like an url-encoded form but without percent-escaping the JSON
+    of rest_data, that would grow it two or three times. Optionally, large bodies
+    are gzip-compressed; this needs a server that decompresses request bodies,
+    like Apache with mod_deflate's DEFLATE input filter.
+
+    When measure is enabled, the encoder keeps per method statistics of the bytes
+    sent compared to the url-encoded form with default JSON separators, the
+    encoding used by previous versions of the client.
+    """
+
+    def __init__(self, multipart_threshold=2048, compress=False, compress_threshold=8192,
+                 compress_level=6, measure=False):
+        """
+        Creates a RequestEncoder instance.
+
+        :param int multipart_threshold: minimum size of rest_data sent as multipart/form-data,
+            None to always url-encode.
+        :param bool compress: gzip-compress large request bodies.
+        :param int compress_threshold: minimum size of the compressed bodies.
+        :param int compress_level: gzip compression level, from 1 to 9.
+        :param bool measure: keep statistics of the bytes saved per method.
+        """
+        self.multipart_threshold = multipart_threshold
+        self.compress = compress
+        self.compress_threshold = compress_threshold
+        self.compress_level = compress_level
+        self.measure = measure
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def encode(self, data):
+        """
+        Encode the form fields of a request.
+
+        :param dict[str, str] data: form fields.
+        :return: the body and the headers of the request.
+        :rtype: tuple[str, dict[str, str]]
+        """
+        rest_data = data.get('rest_data') or ''
+        if self.multipart_threshold is not None and len(rest_data) >= self.multipart_threshold:
+            body, content_type = self._encode_multipart(data)
+        else:
+            body, content_type = urllib.urlencode(data), FORM_CONTENT_TYPE
+        headers = {'Content-Type': content_type}
+        if self.compress and len(body) >= self.compress_threshold:
+            compressor = zlib.compressobj(self.compress_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            body = compressor.compress(body) + compressor.flush()
+            headers['Content-Encoding'] = 'gzip'
+        if self.measure:
+            self._measure(data, len(body))
+        return body, headers
+
+    @staticmethod
+    def _encode_multipart(data):
+        boundary = uuid.uuid4().hex
+        parts = []
+        for name, value in data.items():
+            if isinstance(value, unicode):
+                value = value.encode('utf8')
+            parts.append('--%s\r\nContent-Disposition: form-data; name="%s"\r\n\r\n%s\r\n'
+                         % (boundary, name, value))
+        parts.append('--%s--\r\n' % boundary)
+        return ''.join(parts), 'multipart/form-data; boundary=' + boundary
+
+    def _measure(self, data, sent_bytes):
+        legacy = dict(data)
+        try:
+            legacy['rest_data'] = json.dumps(json.loads(data['rest_data'],
+                                                        object_pairs_hook=OrderedDict))
+        except (KeyError, TypeError, ValueError):
+            pass
+        legacy_bytes = len(urllib.urlencode(legacy))
+        with self._lock:
+            stats = self._stats.get(data.get('method'))
+            if stats is None:
+                stats = self._stats[data.get('method')] = {
+                    'requests': 0,
+                    'legacy_bytes': 0,
+                    'sent_bytes': 0
+                }
+            stats['requests'] += 1
+            stats['legacy_bytes'] += legacy_bytes
+            stats['sent_bytes'] += sent_bytes
+
+    def get_stats(self):
+        """
+        Get the statistics of the bytes saved per method, when measure is enabled.
+
+        :return: dict with the number of requests, the bytes of the legacy encoding,
+            the bytes sent and the bytes saved of each method.
+        :rtype: dict[str, dict[str, int]]
+        """
+        with self._lock:
+            stats = dict((method, dict(values)) for method, values in self._stats.items())
+        for values in stats.values():
+            values['saved_bytes'] = values['legacy_bytes'] - values['sent_bytes']
+        return stats
+
+    def reset_stats(self):
+        """
+        Discard the statistics.
+        """
+        with self._lock:
+            self._stats.clear()
@@ -0,0 +1,255 @@
+#######################################################################
+# Suite PY is a simple Python client for SuiteCRM API.
+
+# Copyright (C) 2017-2018 BTACTIC, SCCL
+# Copyright (C) 2017-2018 Marc Sanchez Fauste
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#######################################################################
+
+import threading
+import time
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+
+
+class _NoopPriority(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NOOP_PRIORITY = _NoopPriority()
+
+
+class PriorityClass(object):
+    """
+    This class represents a class of requests of a RequestScheduler.
+    """
+
+    def __init__(self, name, weight=1, max_concurrency=None):
+        """
+        Creates a PriorityClass instance.
+
+        :param str name: name of the class.
+        :param float weight: share of the requests sent when several classes are waiting.
+        :param int max_concurrency: maximum number of requests of the class in flight,
+            None for no limit other than the one of the scheduler.
+        """
+        self.name = name
+        self.weight = weight
+        self.max_concurrency = max_concurrency
+        self._waiting = deque()
+        self._in_flight = 0
+        self._virtual_time = 0.0
+        self._stats = {'dispatched': 0, 'wait_time': 0.0, 'max_wait': 0.0}
+
+    def _can_dispatch(self):
+        return self._waiting and (self.max_concurrency is None
+                                  or self._in_flight < self.max_concurrency)
+
+
+class RequestScheduler(object):
+    """
+    This class bounds the number of requests in flight to SuiteCRM and decides which
+    waiting request is sent next, so interactive requests don't wait behind the
+    pages of exports or the batches of imports.
+
+    Requests are assigned to a priority class: the one set on the current thread
+    with priority, or else the class of their method in method_classes, or else
+    default_class. When a request can't be sent, because max_in_flight requests or
+    the maximum of its class are in flight, it waits in the queue of its class.
+    Queues are served with weighted fair queuing: while several classes are waiting,
+    each one gets a share of the requests sent proportional to its weight, and the
+    requests of each class are sent in order.
+
+    By default, interactive requests have ten times the weight of bulk ones and bulk
+    requests can only use three quarters of max_in_flight, so there are always free
+    connections for interactive ones. The paginated iterations and bulk writes of
+    SuiteCRM use the bulk class unless another one is set. A scheduler can be shared
+    by several clients to bound the requests sent to the same SuiteCRM instance.
+    """
+
+    def __init__(self, max_in_flight=8, classes=None, default_class=INTERACTIVE,
+                 method_classes=None):
+        """
+        Creates a RequestScheduler instance.
+
+        :param int max_in_flight: maximum number of requests in flight.
+        :param list[PriorityClass] classes: the priority classes. If not specified,
+            the interactive and bulk classes are created.
+        :param str default_class: class of the requests without other class.
+        :param dict[str, str] method_classes: class of the requests of each method.
+        """
+        if classes is None:
+            classes = [
+                PriorityClass(INTERACTIVE, weight=10),
+                PriorityClass(BULK, weight=1, max_concurrency=max(1, max_in_flight * 3 // 4))
+            ]
+        self.max_in_flight = max_in_flight
+        self._classes = OrderedDict((priority_class.name, priority_class)
+                                    for priority_class in classes)
+        self.default_class = default_class
+        self.method_classes = dict(method_classes or {})
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._in_flight = 0
+        self._virtual_time = 0.0
+
+    def _get_class(self, name):
+        try:
+            return self._classes[name]
+        except KeyError:
+            raise ValueError('Unknown priority class: %s' % name)
+
+    def get_priority(self):
+        """
+        Get the priority class set on the current thread.
+
+        :return: name of the class, or None if none is set.
+        :rtype: str
+        """
+        return getattr(self._local, 'priority', None)
+
+    @contextmanager
+    def priority(self, name, default=False):
+        """
+        Set the priority class of the requests made by the current thread.
+
+        :param str name: name of the class.
+        :param bool default: only set it if the current thread has no class set.
+        """
+        self._get_class(name)
+        previous = self.get_priority()
+        if default and previous is not None:
+            yield
+            return
+        self._local.priority = name
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    def bind(self, function, default=None):
+        """
+        Bind a function to the priority class of the current thread, so the requests
+        it makes from other threads, like page prefetchers, use the same class.
+
+        :param function function: function to bind.
+        :param str default: class used if the current thread has no class set.
+        :return: the bound function.
+        :rtype: function
+        """
+        name = self.get_priority() or default
+        if name is None:
+            return function
+
+        def bound(*args, **kwargs):
+            with self.priority(name):
+                return function(*args, **kwargs)
+        return bound
+
+    @contextmanager
+    def slot(self, method=None):
+        """
+        Wait until a request can be sent, and keep its place in flight while it is sent.
+        Nested slots of the same thread use the place of the outer one.
+
+        :param str method: method of the request.
+        """
+        if getattr(self._local, 'depth', 0):
+            self._local.depth += 1
+            try:
+                yield
+            finally:
+                self._local.depth -= 1
+            return
+        name = self.get_priority() or self.method_classes.get(method, self.default_class)
+        priority_class = self._get_class(name)
+        self._acquire(priority_class)
+        self._local.depth = 1
+        try:
+            yield
+        finally:
+            self._local.depth = 0
+            self._release(priority_class)
+
+    def schedule(self, call):
+        """
+        Wrap a function sending requests so each one waits for its slot.
+
+        :param function call: function that receives a method and its parameters.
+        :return: the wrapped function.
+        :rtype: function
+        """
+        def scheduled(method, parameters):
+            with self.slot(method):
+                return call(method, parameters)
+        return scheduled
+
+    def _acquire(self, priority_class):
+        ticket = threading.Event()
+        with self._lock:
+            if not priority_class._waiting and not priority_class._in_flight:
+                priority_class._virtual_time = max(priority_class._virtual_time,
+                                                   self._virtual_time)
+            priority_class._waiting.append((ticket, time.time()))
+            self._dispatch()
+        ticket.wait()
+
+    def _release(self, priority_class):
+        with self._lock:
+            priority_class._in_flight -= 1
+            self._in_flight -= 1
+            self._dispatch()
+
+    def _dispatch(self):
+        while self._in_flight < self.max_in_flight:
+            candidates = [priority_class for priority_class in self._classes.values()
+                          if priority_class._can_dispatch()]
+            if not candidates:
+                return
+            priority_class = min(candidates, key=lambda candidate: candidate._virtual_time)
+            ticket, enqueued = priority_class._waiting.popleft()
+            priority_class._in_flight += 1
+            self._in_flight += 1
+            self._virtual_time = priority_class._virtual_time
+            priority_class._virtual_time += 1.0 / priority_class.weight
+            wait = time.time() - enqueued
+            stats = priority_class._stats
+            stats['dispatched'] += 1
+            stats['wait_time'] += wait
+            stats['max_wait'] = max(stats['max_wait'], wait)
+            ticket.set()
+
+    def get_stats(self):
+        """
+        Get the statistics of each priority class.
+
+        :return: dict with the requests in flight and waiting, the requests sent, and
+            the total and maximum seconds waited by them, of each class.
+        :rtype: dict[str, dict[str, object]]
+        """
+        with self._lock:
+            stats = {}
+            for name, priority_class in self._classes.items():
+                stats[name] = dict(priority_class._stats, in_flight=priority_class._in_flight,
+                                   waiting=len(priority_class._waiting))
+            return stats
@@ -0,0 +1,247 @@
+#######################################################################
+# Suite PY is a simple Python client for SuiteCRM API.
+
+# Copyright (C) 2017-2018 BTACTIC, SCCL
+# Copyright (C) 2017-2018 Marc Sanchez Fauste
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#######################################################################
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class SessionStore(object):
+    """
+    Base class of the stores that keep the session IDs of SuiteCRM clients
+    across processes, keyed by the URL of the API and the username.
+
+    Each session is saved with the time it was last seen valid. Sessions not seen
+    valid for more than max_age seconds are not reused, as SuiteCRM has probably
+    expired them. The lock method serializes the logins of concurrent processes,
+    so when a session expires only one of them logs in again.
+    """
+
+    def __init__(self, path, max_age=1200, touch_interval=60):
+        """
+        Creates a SessionStore instance.
+
+        :param str path: path of the store.
+        :param float max_age: seconds a session is reused since it was last seen valid.
+        :param float touch_interval: minimum seconds between updates of the last time
+            a session was seen valid.
+        """
+        self.path = path
+        self.max_age = max_age
+        self.touch_interval = touch_interval
+        self._thread_lock = threading.RLock()
+        self._touched = {}
+
+    @staticmethod
+    def _get_key(url, username):
+        return url + '|' + username
+
+    def get(self, url, username):
+        """
+        Get the stored session of a user.
+
+        :param str url: URL of the SuiteCRM API.
+        :param str username: login username.
+        :return: the session ID, or None if there is no session or it is too old.
+        :rtype: str
+        """
+        entry = self._read(self._get_key(url, username))
+        if entry is None or time.time() - entry['validated'] > self.max_age:
+            return None
+        return entry['session_id']
+
+    def save(self, url, username, session_id):
+        """
+        Store the session of a user, just obtained or seen valid.
+
+        :param str url: URL of the SuiteCRM API.
+        :param str username: login username.
+        :param str session_id: the session ID.
+        """
+        key = self._get_key(url, username)
+        now = time.time()
+        self._write(key, {'session_id': session_id, 'validated': now})
+        self._touched[key] = (session_id, now)
+
+    def touch(self, url, username, session_id):
+        """
+        Record that a session has been seen valid. The store is only updated
+        once every touch_interval seconds.
+
+        :param str url: URL of the SuiteCRM API.
+        :param str username: login username.
+        :param str session_id: the session ID.
+        """
+        touched = self._touched.get(self._get_key(url, username))
+        if touched is None or touched[0] != session_id \
+                or time.time() - touched[1] >= self.touch_interval:
+            self.save(url, username, session_id)
+
+    def invalidate(self, url, username, session_id):
+        """
+        Remove the stored session of a user, if it is still the specified one.
+
+        :param str url: URL of the SuiteCRM API.
+        :param str username: login username.
+        :param str session_id: the session ID found invalid.
+        """
+        key = self._get_key(url, username)
+        self._touched.pop(key, None)
+        self._delete(key, session_id)
+
+    @contextmanager
+    def lock(self, url, username):
+        """
+        Lock the session of a user across threads and processes, while logging in.
+
+        :param str url: URL of the SuiteCRM API.
+        :param str username: login username.
+        """
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.path + '.lock', 'a') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read(self, key):
+        raise NotImplementedError()
+
+    def _write(self, key, entry):
+        raise NotImplementedError()
+
+    def _delete(self, key, session_id):
+        raise NotImplementedError()
+
+
+class FileSessionStore(SessionStore):
+    """
+    This class stores the sessions on a JSON file, which is replaced atomically.
+
+    When processes of several users update the file at the same time an update
+    may be lost, which only costs an extra login. SQLiteSessionStore does not
+    have this limitation.
+    """
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def _dump(self, sessions):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temporary_path = tempfile.mkstemp(dir=directory, prefix='.suitepy-sessions-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(sessions, f)
+        os.chmod(temporary_path, 0o600)
+        os.rename(temporary_path, self.path)
+
+    def _read(self, key):
+        return self._load().get(key)
+
+    def _write(self, key, entry):
+        with self._thread_lock:
+            sessions = self._load()
+            sessions[key] = entry
+            self._dump(sessions)
+
+    def _delete(self, key, session_id):
+        with self._thread_lock:
+            sessions = self._load()
+            if sessions.get(key, {}).get('session_id') == session_id:
+                del sessions[key]
+                self._dump(sessions)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    This class stores the sessions on a SQLite database.
+    """
+
+    def __init__(self, path, max_age=1200, touch_interval=60):
+        super(SQLiteSessionStore, self).__init__(path, max_age, touch_interval)
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute('CREATE TABLE IF NOT EXISTS sessions ('
+                                   'key TEXT PRIMARY KEY, session_id TEXT, validated REAL)')
+        finally:
+            connection.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _read(self, key):
+        connection = self._connect()
+        try:
+            row = connection.execute('SELECT session_id, validated FROM sessions WHERE key = ?',
+                                     (key,)).fetchone()
+        finally:
+            connection.close()
+        if row is None:
+            return None
+        return {'session_id': row[0], 'validated': row[1]}
+
+    def _write(self, key, entry):
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute('INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)',
+                                   (key, entry['session_id'], entry['validated']))
+        finally:
+            connection.close()
+
+    def _delete(self, key, session_id):
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute('DELETE FROM sessions WHERE key = ? AND session_id = ?',
+                                   (key, session_id))
+        finally:
+            connection.close()
+
+
+def open_session_store(path, **kwargs):
+    """
+    Open a session store, a SQLiteSessionStore if the path ends with .db, .sqlite
+    or .sqlite3 and a FileSessionStore otherwise.
+
+    :param str path: path of the store.
+    :return: the session store.
+    :rtype: SessionStore
+    """
+    if os.path.splitext(path)[1].lower() in ('.db', '.sqlite', '.sqlite3'):
+        return SQLiteSessionStore(path, **kwargs)
+    return FileSessionStore(path, **kwargs)
@@ -20,10 +20,13 @@
 
 
 class Singleton(object):
+    """
+    Base class of classes with a single instance. Each subclass has its own instance.
+    """
 
     _instance = None
 
     def __new__(cls, *args, **kwargs):
-        if not cls._instance:
-            cls._instance = object.__new__(cls, *args, **kwargs)
+        if not cls.__dict__.get('_instance'):
+            cls._instance = object.__new__(cls)
         return cls._instance
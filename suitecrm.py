@@ -18,64 +18,429 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #######################################################################
 
-import requests
 import hashlib
+import base64
 import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib
+import uuid
 from collections import OrderedDict
 from suite_exceptions import *
+from attachments import Base64FieldDecoder, Base64FormBody, BLOCK_SIZE
 from bean import Bean
 from bean_exceptions import *
 from config import Config
+from hedging import RequestHedger
+from instrumentation import Instrumentation, MetricsCollector
+from page_size import PageSizeController
+from pagination import iter_pages
+import profiling
+from projection import FieldProjection
+from scheduler import BULK, NOOP_PRIORITY, RequestScheduler
+from session_store import open_session_store
 from singleton import Singleton
+from thread_pool import ThreadPool
+from tracing import InMemorySpanExporter, NOOP_SPAN, Tracer
+from transport import HTTPTransport
 
 
 class SuiteCRM(Singleton):
     """
     This class contains methods to interact with a SuiteCRM instance.
+
+    When it is created without a config, the default config is used and a single
+    shared instance is returned. When a config is specified, an independent client
+    is created, with its own session, connections and cache, so one process can
+    talk to several SuiteCRM instances or use several credentials.
     """
 
     conf = Config()
     _session_id = None
+    _field_projection = None
+    _instrumentation = None
+    _tracer = None
+    _transport = None
+    _session_store = None
+    _page_size_controller = None
+    _scheduler = None
+    _hedger = None
+    _hedge_session_id = None
+    _count_ttl = 30
+    _file_placeholder = 'suitepy-file-placeholder'
+
+    def __new__(cls, conf=None, *args, **kwargs):
+        if conf is None:
+            return Singleton.__new__(cls)
+        return object.__new__(cls)
 
-    def __init__(self):
-        if not self._session_id:
+    def __init__(self, conf=None, transport=None):
+        """
+        Creates a SuiteCRM client. The config is read and the client logs in
+        when the first request is made.
+
+        :param Config conf: config of the client. If not specified, the default config is
+            used and the shared instance is returned.
+        :param transport: transport used to send requests, by default a HTTPTransport.
+        """
+        if conf is not None:
+            self.conf = conf
+        if transport is not None:
+            self._transport = transport
+        if '_login_lock' not in self.__dict__:
+            self._login_lock = threading.Lock()
+            self._counts = {}
+            self._counts_lock = threading.Lock()
+            self._hedge_lock = threading.Lock()
+
+    def _ensure_session(self):
+        with self._login_lock:
+            if not self._session_id:
+                profiling.start_from_config(self.conf)
+                self._open_session()
+
+    def _renew_session(self, invalid_session_id):
+        with self._login_lock:
+            if self._session_id == invalid_session_id:
+                self._open_session(invalid_session_id)
+
+    def _open_session(self, invalid_session_id=None):
+        store = self._get_session_store()
+        if store is None:
+            self._login()
+            return
+        url, username = self.conf.url, self.conf.username
+        if invalid_session_id:
+            store.invalidate(url, username, invalid_session_id)
+        with store.lock(url, username):
+            session_id = store.get(url, username)
+            if session_id and session_id != invalid_session_id:
+                self._session_id = session_id
+                return
             self._login()
+            store.save(url, username, self._session_id)
+
+    def _get_session_store(self):
+        if self._session_store is None and self.conf.session_store:
+            self._session_store = open_session_store(self.conf.session_store)
+        return self._session_store
+
+    def set_session_store(self, store):
+        """
+        Set the store used to share the session with other processes. The client reuses
+        a stored session that is still valid instead of logging in, and concurrent
+        processes are coordinated so only one of them logs in when it expires.
+
+        By default the store specified by the session_store setting of the config is used.
+
+        :param SessionStore store: the session store, or None to stop sharing the session.
+        """
+        self._session_store = store
 
     def _call(self, method, parameters):
-        data = {
+        send = self._send
+        if self._hedger is not None and method in self._hedger.methods:
+            send = self._send_hedged
+        if self._scheduler is not None:
+            with self._scheduler.slot(method):
+                return send(method, parameters)
+        return send(method, parameters)
+
+    def _send_hedged(self, method, parameters):
+        return self._hedger.call(method, lambda: self._send(method, parameters),
+                                 lambda: self._send_hedge(method, parameters))
+
+    def _send_hedge(self, method, parameters):
+        if not self._hedger.separate_session or 'session' not in parameters:
+            return self._send(method, parameters)
+        with self._hedge_lock:
+            if not self._hedge_session_id:
+                self._hedge_session_id = self._send('login', self._get_login_parameters())['id']
+            session_id = self._hedge_session_id
+        hedge_parameters = OrderedDict(parameters)
+        hedge_parameters['session'] = session_id
+        try:
+            return self._send(method, hedge_parameters)
+        except InvalidSessionIDException:
+            with self._hedge_lock:
+                if self._hedge_session_id == session_id:
+                    self._hedge_session_id = None
+            raise
+
+    def _send(self, method, parameters):
+        if self._instrumentation is not None or self._tracer is not None:
+            return self._observed_call(method, parameters)
+        r = self._post(self._encode_request(method, parameters))
+        return self._decode_response(r.text)
+
+    def _observed_call(self, method, parameters):
+        instrumentation = self._instrumentation
+        if instrumentation is not None:
+            instrumentation.emit('before_call', method=method, parameters=parameters)
+        event = {
+            'method': method,
+            'error': None,
+            'request_bytes': 0,
+            'response_bytes': 0,
+            'result_count': None,
+            'encode': None,
+            'network': None,
+            'decode': None
+        }
+        with self._span('suitecrm.call', method=method,
+                        module=parameters.get('module_name')) as span:
+            start = time.time()
+            try:
+                data = self._encode_request(method, parameters)
+                encoded = time.time()
+                event['encode'] = encoded - start
+                r = self._post(data)
+                received = time.time()
+                event['network'] = received - encoded
+                event['request_bytes'] = len(r.request.body or '')
+                event['response_bytes'] = len(r.content)
+                response = self._decode_response(r.text)
+                event['decode'] = time.time() - received
+                event['result_count'] = self._get_result_count(response)
+                return response
+            except Exception as e:
+                event['error'] = e
+                raise
+            finally:
+                event['total'] = time.time() - start
+                span.set_attribute('request_bytes', event['request_bytes'])
+                span.set_attribute('response_bytes', event['response_bytes'])
+                span.set_attribute('result_count', event['result_count'])
+                if instrumentation is not None:
+                    instrumentation.emit('after_call', **event)
+
+    @staticmethod
+    def _get_result_count(response):
+        if 'result_count' in response:
+            return response['result_count']
+        if isinstance(response.get('entry_list'), list):
+            return len(response['entry_list'])
+        return None
+
+    @staticmethod
+    def _encode_request(method, parameters):
+        return {
             'method': method,
             'input_type': 'JSON',
             'response_type': 'JSON',
-            'rest_data': json.dumps(parameters),
+            'rest_data': json.dumps(parameters, separators=(',', ':')),
         }
-        r = requests.post(self.conf.url, data=data, verify=self.conf.verify_ssl)
+
+    def _post(self, data, **kwargs):
+        r = self.transport.post(self.conf.url, data, verify=self.conf.verify_ssl, **kwargs)
         r.raise_for_status()
-        response = json.loads(r.text, object_pairs_hook=OrderedDict)
+        return r
+
+    @property
+    def transport(self):
+        """
+        Get the transport used to send requests to SuiteCRM.
+
+        :return: the transport, by default a HTTPTransport.
+        :rtype: HTTPTransport
+        """
+        if self._transport is None:
+            self._transport = HTTPTransport()
+        return self._transport
+
+    def set_transport(self, transport):
+        """
+        Set the transport used to send requests to SuiteCRM, for example a
+        RecordingTransport to capture the traffic or a ReplayTransport to
+        reproduce it without connecting to SuiteCRM.
+
+        :param transport: object with a post(url, data, **kwargs) method returning a response.
+        """
+        self._transport = transport
+
+    def _decode_response(self, text):
+        if self._page_size_controller is not None:
+            self._page_size_controller.record_response(len(text))
+        response = json.loads(text, object_pairs_hook=OrderedDict)
         if self._call_failed(response):
             raise SuiteException.get_suite_exception(response)
         return response
 
-    def _request(self, method, parameters):
-        try:
-            return self._call(method, parameters)
-        except InvalidSessionIDException:
-            self._login()
-            parameters['session'] = self._session_id
-            return self._call(method, parameters)
+    def _request(self, method, parameters, call=None):
+        if call is None:
+            call = self._call
+        elif self._scheduler is not None:
+            call = self._scheduler.schedule(call)
+        with self._span('suitecrm.request', method=method, module=parameters.get('module_name')):
+            if not self._session_id:
+                self._ensure_session()
+                if 'session' in parameters:
+                    parameters['session'] = self._session_id
+            try:
+                response = call(method, parameters)
+            except InvalidSessionIDException:
+                if self._instrumentation is not None:
+                    self._instrumentation.emit('relogin', method=method)
+                    self._instrumentation.emit('retry', method=method, reason='invalid_session')
+                with self._span('suitecrm.relogin', method=method):
+                    self._renew_session(parameters.get('session', self._session_id))
+                parameters['session'] = self._session_id
+                with self._span('suitecrm.retry', method=method, reason='invalid_session'):
+                    return call(method, parameters)
+            if self._session_store is not None and 'session' in parameters:
+                self._session_store.touch(self.conf.url, self.conf.username, parameters['session'])
+            return response
+
+    def _span(self, name, parent=None, **attributes):
+        if self._tracer is None:
+            return NOOP_SPAN
+        return self._tracer.start_span(name, parent, **attributes)
+
+    def enable_tracing(self, tracer=None):
+        """
+        Enable tracing of the requests, calls, re-logins, retries
+        and paginated iterations made to SuiteCRM.
+
+        :param Tracer tracer: tracer used to create the spans.
+            If not specified, a Tracer with an InMemorySpanExporter is created.
+        :return: the tracer used.
+        :rtype: Tracer
+        """
+        if tracer is None:
+            tracer = Tracer([InMemorySpanExporter()])
+        self._tracer = tracer
+        return tracer
+
+    def disable_tracing(self):
+        """
+        Disable tracing of the requests made to SuiteCRM.
+        """
+        self._tracer = None
+
+    def enable_instrumentation(self, instrumentation=None):
+        """
+        Enable the instrumentation of the calls made to SuiteCRM.
+
+        :param Instrumentation instrumentation: instrumentation that will receive the events.
+            If not specified, an Instrumentation with a MetricsCollector is created.
+        :return: the instrumentation used.
+        :rtype: Instrumentation
+        """
+        if instrumentation is None:
+            instrumentation = Instrumentation(MetricsCollector())
+        self._instrumentation = instrumentation
+        return instrumentation
+
+    def disable_instrumentation(self):
+        """
+        Disable the instrumentation of the calls made to SuiteCRM.
+        """
+        self._instrumentation = None
+
+    def enable_adaptive_page_size(self, controller=None):
+        """
+        Enable the tuning of the page size of the paginated iterations, like iter_bean_list
+        and iter_relationships, when they are called without a limit.
+
+        :param PageSizeController controller: controller of the page sizes.
+            If not specified, a PageSizeController with the default settings is created.
+        :return: the controller used.
+        :rtype: PageSizeController
+        """
+        if controller is None:
+            controller = PageSizeController()
+        self._page_size_controller = controller
+        return controller
+
+    def disable_adaptive_page_size(self):
+        """
+        Disable the tuning of the page size of the paginated iterations.
+        """
+        self._page_size_controller = None
+
+    def enable_request_scheduler(self, scheduler=None):
+        """
+        Enable the scheduling of the requests sent to SuiteCRM by priority class,
+        bounding the requests in flight.
+
+        :param RequestScheduler scheduler: scheduler of the requests, which may be shared
+            with other clients. If not specified, a RequestScheduler with the default
+            settings is created.
+        :return: the scheduler used.
+        :rtype: RequestScheduler
+        """
+        if scheduler is None:
+            scheduler = RequestScheduler()
+        self._scheduler = scheduler
+        return scheduler
+
+    def disable_request_scheduler(self):
+        """
+        Disable the scheduling of the requests sent to SuiteCRM.
+        """
+        self._scheduler = None
+
+    def enable_hedging(self, hedger=None):
+        """
+        Enable the hedging of the read requests that take longer than usual, sending
+        a duplicate and using the response that arrives first.
+
+        :param RequestHedger hedger: hedger of the requests.
+            If not specified, a RequestHedger with the default settings is created.
+        :return: the hedger used.
+        :rtype: RequestHedger
+        """
+        if hedger is None:
+            hedger = RequestHedger()
+        self._hedger = hedger
+        return hedger
+
+    def disable_hedging(self):
+        """
+        Disable the hedging of the requests.
+        """
+        self._hedger = None
+
+    def _bulk_priority(self):
+        if self._scheduler is None:
+            return NOOP_PRIORITY
+        return self._scheduler.priority(BULK, default=True)
+
+    def _bind_bulk_priority(self, function):
+        if self._scheduler is None:
+            return function
+        return self._scheduler.bind(function, BULK)
+
+    def _fetch_sized_page(self, key, limit, fetch_page):
+        if limit:
+            return fetch_page(limit)
+        if self._page_size_controller is None:
+            return fetch_page(100)
+        return self._page_size_controller.fetch(key, fetch_page)
+
+    def _beans_built(self, method, start, count):
+        self._instrumentation.emit('beans_built', method=method, count=count,
+                                   duration=time.time() - start)
 
     @staticmethod
     def _call_failed(result):
         return not result or (len(result) == 3 and 'name' in result
                               and 'description' in result and 'number' in result)
 
-    def _login(self):
+    def _get_login_parameters(self):
         login_parameters = OrderedDict()
         login_parameters['user_auth'] = {
             'user_name': self.conf.username,
             'password': self._md5(self.conf.password)
         }
         login_parameters['application_name'] = self.conf.application_name
-        login_result = self._call('login', login_parameters)
+        return login_parameters
+
+    def _login(self):
+        login_result = self._call('login', self._get_login_parameters())
         self._session_id = login_result['id']
 
     @staticmethod
@@ -106,6 +471,21 @@ class SuiteCRM(Singleton):
         :raises BeanNotFoundException: if the Bean is not found.
         :raises SuiteException: if error when retrieving bean from SuiteCRM instance.
         """
+        call_site = None
+        if self._field_projection is not None and not select_fields:
+            call_site = self._get_call_site('get_bean', module_name)
+            select_fields = self._field_projection.get_select_fields(call_site)
+        bean = self._get_bean(module_name, id, select_fields,
+                              link_name_to_fields_array, track_view)
+        if call_site is not None:
+            self._field_projection.track(
+                call_site, bean, select_fields,
+                self._get_full_bean_loader(module_name, id, link_name_to_fields_array)
+            )
+        return bean
+
+    def _get_bean(self, module_name, id, select_fields='',
+                  link_name_to_fields_array='', track_view=''):
         parameters = OrderedDict()
         parameters['session'] = self._session_id
         parameters['module_name'] = module_name
@@ -117,11 +497,43 @@ class SuiteCRM(Singleton):
         if self._get_bean_failed(result):
             error_msg = result['entry_list'][0]['name_value_list'][0]['value']
             raise BeanNotFoundException(error_msg)
-        return Bean(
+        start = time.time() if self._instrumentation is not None else None
+        bean = Bean(
             module_name,
             result['entry_list'][0]['name_value_list'],
             result['relationship_list'][0] if len(result['relationship_list']) > 0 else []
         )
+        if start is not None:
+            self._beans_built('get_entry', start, 1)
+        return bean
+
+    @staticmethod
+    def _get_call_site(method, module_name):
+        caller = sys._getframe(2)
+        return (method, module_name, caller.f_code.co_filename, caller.f_lineno)
+
+    def _get_full_bean_loader(self, module_name, id, link_name_to_fields_array=''):
+        return lambda: self._get_bean(module_name, id,
+                                      link_name_to_fields_array=link_name_to_fields_array)
+
+    def enable_field_projection(self, warm_up_calls=3):
+        """
+        Enable automatic projection of the fields retrieved by get_bean and get_bean_list.
+
+        The fields read from the returned Beans are recorded for each call site and,
+        after the warm up calls, only those fields are retrieved when select_fields
+        is not specified. Reading a field that was not retrieved makes the Bean
+        retrieve all its fields from SuiteCRM.
+
+        :param int warm_up_calls: number of calls of each call site that retrieve all the fields.
+        """
+        self._field_projection = FieldProjection(warm_up_calls)
+
+    def disable_field_projection(self):
+        """
+        Disable automatic projection of the fields retrieved by get_bean and get_bean_list.
+        """
+        self._field_projection = None
 
     def save_bean(self, bean):
         """
@@ -135,9 +547,77 @@ class SuiteCRM(Singleton):
         parameters['module_name'] = bean.module
         parameters['name_value_list'] = bean.name_value_list
         result = self._request('set_entry', parameters)
+        self._invalidate_counts(bean.module)
         bean._set_name_value_list(result['entry_list'])
         bean['id'] = result['id']
 
+    def save_beans(self, beans, chunk_size=100, assign_ids=False):
+        """
+        Saves several Bean objects to SuiteCRM using as few requests as possible.
+
+        Beans are grouped by module and sent with set_entries in chunks of at most
+        chunk_size beans. When the request of a chunk fails, its beans are saved one by
+        one, so failures are reported for each bean. As SuiteCRM may have created some
+        of the new beans of a failed chunk, new beans are only saved again when they
+        were given an ID with assign_ids; otherwise they are reported as failed.
+
+        :param iterable beans: Bean objects.
+        :param int chunk_size: maximum number of beans sent on each request.
+        :param bool assign_ids: give new beans a random ID before saving them,
+            so saving them again never creates duplicates.
+        :return: dict containing the number of saved beans and the list of
+            (bean, exception) tuples of the beans that failed.
+        :rtype: dict[str, object]
+        """
+        grouped = OrderedDict()
+        for bean in beans:
+            if assign_ids and not bean['id']:
+                bean['id'] = str(uuid.uuid4())
+                bean['new_with_id'] = True
+            grouped.setdefault(bean.module, []).append(bean)
+        saved = 0
+        failed = []
+        with self._bulk_priority():
+            for module_name, module_beans in grouped.items():
+                for start in range(0, len(module_beans), chunk_size):
+                    chunk = module_beans[start:start + chunk_size]
+                    parameters = OrderedDict()
+                    parameters['session'] = self._session_id
+                    parameters['module_name'] = module_name
+                    parameters['name_value_lists'] = [bean.name_value_list for bean in chunk]
+                    try:
+                        result = self._request('set_entries', parameters)
+                    except Exception as e:
+                        for bean in chunk:
+                            if not bean['id']:
+                                failed.append((bean, e))
+                                continue
+                            try:
+                                if bean['new_with_id'] and self._bean_exists(module_name, bean['id']):
+                                    del bean._fields['new_with_id']
+                                self.save_bean(bean)
+                                bean._fields.pop('new_with_id', None)
+                                saved += 1
+                            except Exception as bean_error:
+                                failed.append((bean, bean_error))
+                        continue
+                    for bean, id in zip(chunk, result['ids']):
+                        bean['id'] = id
+                        bean._fields.pop('new_with_id', None)
+                    saved += len(chunk)
+                self._invalidate_counts(module_name)
+        return {
+            "saved": saved,
+            "failed": failed
+        }
+
+    def _bean_exists(self, module_name, id):
+        try:
+            self._get_bean(module_name, id, ['id'])
+            return True
+        except BeanNotFoundException:
+            return False
+
     def get_bean_list(self, module_name, query='', order_by='',
                       offset='', select_fields='', link_name_to_fields_array='',
                       max_results='', deleted='', favorites=''):
@@ -161,6 +641,10 @@ class SuiteCRM(Singleton):
         :rtype: dict[str, object]
         :raises SuiteException: if error when retrieving beans from SuiteCRM instance.
         """
+        call_site = None
+        if self._field_projection is not None and not select_fields:
+            call_site = self._get_call_site('get_bean_list', module_name)
+            select_fields = self._field_projection.get_select_fields(call_site)
         parameters = OrderedDict()
         parameters['session'] = self._session_id
         parameters['module_name'] = module_name
@@ -173,9 +657,18 @@ class SuiteCRM(Singleton):
         parameters['deleted'] = deleted
         parameters['favorites'] = favorites
         result = self._request('get_entry_list', parameters)
+        start = time.time() if self._instrumentation is not None else None
         bean_list = []
         for entry in result['entry_list']:
-            bean_list.append(Bean(module_name, entry['name_value_list']))
+            bean = Bean(module_name, entry['name_value_list'])
+            if call_site is not None and 'id' in bean._fields:
+                self._field_projection.track(
+                    call_site, bean, select_fields,
+                    self._get_full_bean_loader(module_name, bean._fields['id'])
+                )
+            bean_list.append(bean)
+        if start is not None:
+            self._beans_built('get_entry_list', start, len(bean_list))
         previous_offset = None
         if offset and max_results and offset - max_results >= 0:
             previous_offset = offset - max_results
@@ -195,6 +688,213 @@ class SuiteCRM(Singleton):
             "entry_list": bean_list
         }
 
+    def count_beans(self, module_name, query='', deleted=False, ttl=None):
+        """
+        Get the number of beans matching criteria, without retrieving them.
+
+        Counts are cached for a short time, so progress reports or work planning can
+        ask for them repeatedly. Saving a bean of the module discards its cached counts.
+
+        :param str module_name: name of the module to count records from.
+        :param str query: SQL WHERE clause without the word 'WHERE'.
+        :param bool deleted: False if deleted records should not be counted,
+            True if deleted records should be counted.
+        :param float ttl: seconds the count is cached, by default 30. 0 requests a fresh count.
+        :return: number of beans.
+        :rtype: int
+        :raises SuiteException: if error when counting beans on SuiteCRM instance.
+        """
+        if ttl is None:
+            ttl = self._count_ttl
+        key = (module_name, query, bool(deleted))
+        if ttl > 0:
+            with self._counts_lock:
+                cached = self._counts.get(key)
+            if cached is not None and cached[0] > time.time():
+                return cached[1]
+        parameters = OrderedDict()
+        parameters['session'] = self._session_id
+        parameters['module_name'] = module_name
+        parameters['query'] = query
+        parameters['deleted'] = 1 if deleted else 0
+        count = int(self._request('get_entries_count', parameters)['result_count'])
+        if ttl > 0:
+            with self._counts_lock:
+                self._counts[key] = (time.time() + ttl, count)
+        return count
+
+    def _invalidate_counts(self, module_name):
+        with self._counts_lock:
+            for key in [key for key in self._counts if key[0] == module_name]:
+                del self._counts[key]
+
+    def iter_bean_list(self, module_name, query='', select_fields='', link_name_to_fields_array='',
+                       deleted='', favorites='', limit=None, keyset=True, order_field='date_entered',
+                       table_name=None, prefetch=1):
+        """
+        Iterate over all the beans matching criteria, retrieving them page by page.
+
+        By default pages are retrieved with keyset pagination: beans are ordered by
+        order_field and id, and each page is requested with a query that continues after
+        the last bean of the previous page, instead of an offset. This way every page costs
+        the same to the database, even at the end of large modules, and beans created while
+        iterating don't make other beans be skipped or returned twice. With keyset disabled,
+        pages are requested by offset, in the default order of SuiteCRM.
+
+        :param str module_name: name of the module to return records from.
+        :param str query: SQL WHERE clause without the word 'WHERE'.
+        :param list[str] select_fields: a list of the fields to be included in the results.
+            On keyset pagination, order_field and id are always included.
+        :param list[dict] link_name_to_fields_array: a list of link_names and for each link_name,
+            what fields value to be returned.
+        :param bool deleted: False if deleted records should not be include,
+            True if deleted records should be included.
+        :param bool favorites: True if only favorites should be included, False otherwise.
+        :param int limit: the number of records retrieved on each request. If not specified,
+            it is tuned when adaptive page sizes are enabled, and 100 otherwise.
+        :param bool keyset: use keyset pagination instead of offsets.
+        :param str order_field: field that orders the beans on keyset pagination,
+            like date_entered or id. It must not be empty on any bean.
+        :param str table_name: database table of the module, used to qualify the fields
+            on the query. By default the module name in lower case.
+        :param int prefetch: maximum number of pages retrieved in advance, 0 disables prefetching.
+        :return: generator of Beans.
+        :rtype: generator
+        :raises SuiteException: if error when retrieving beans from SuiteCRM instance.
+        """
+        parent_span = self._tracer.current_span() if self._tracer is not None else None
+        table_name = table_name or module_name.lower()
+        key_fields = [table_name + '.' + order_field]
+        if order_field != 'id':
+            key_fields.append(table_name + '.id')
+            if select_fields:
+                select_fields = list(select_fields)
+                for field in (order_field, 'id'):
+                    if field not in select_fields:
+                        select_fields.append(field)
+
+        def fetch_page(cursor):
+            with self._span('suitecrm.page', parent_span, method='get_entry_list',
+                            module=module_name, offset=cursor if not keyset else None) as span:
+                if not keyset:
+                    page_query, order_by, offset = query, '', cursor
+                else:
+                    page_query = self._get_keyset_query(query, key_fields, cursor)
+                    order_by = ', '.join(field + ' ASC' for field in key_fields)
+                    offset = 0
+                page = self._fetch_sized_page(module_name, limit, lambda page_size: self.get_bean_list(
+                    module_name, page_query, order_by, offset, select_fields,
+                    link_name_to_fields_array, page_size, deleted, favorites))
+                if keyset:
+                    page['next_offset'] = None
+                    if page['entry_list'] and int(page['total_count']) > page['result_count']:
+                        last = page['entry_list'][-1]
+                        page['next_offset'] = [last[order_field]] if order_field == 'id' \
+                            else [last[order_field], last['id']]
+                span.set_attribute('result_count', page['result_count'])
+                return page
+        for page in iter_pages(self._bind_bulk_priority(fetch_page), [] if keyset else 0, prefetch):
+            for bean in page['entry_list']:
+                yield bean
+
+    @staticmethod
+    def _get_keyset_query(query, key_fields, cursor):
+        if not cursor:
+            return query
+        values = ["'" + unicode(value).replace('\\', '\\\\').replace("'", "''") + "'"
+                  for value in cursor]
+        if len(key_fields) == 1:
+            condition = '%s > %s' % (key_fields[0], values[0])
+        else:
+            condition = '(%s > %s OR (%s = %s AND %s > %s))' % (
+                key_fields[0], values[0], key_fields[0], values[0], key_fields[1], values[1])
+        if query:
+            return '(%s) AND %s' % (query, condition)
+        return condition
+
+    def get_beans(self, module_name, ids, select_fields='',
+                  link_name_to_fields_array='', track_view=''):
+        """
+        Retrieve a list of Beans based on their IDs using a single request.
+
+        :param str module_name: name of the module to return records from.
+        :param list[str] ids: list of bean ids.
+        :param list[str] select_fields: list of the fields to be included in the results.
+            This optional parameter allows for only needed fields to be retrieved.
+        :param list[dict] link_name_to_fields_array: a list of link_names and for each link_name,
+            what fields value to be returned.
+        :param bool track_view: should we track the records accessed.
+        :return: list of Bean objects found, in the same order as ids.
+        :rtype: list[Bean]
+        :raises SuiteException: if error when retrieving beans from SuiteCRM instance.
+        """
+        result = self._get_entries(module_name, ids, select_fields,
+                                   link_name_to_fields_array, track_view)
+        start = time.time() if self._instrumentation is not None else None
+        bean_list = []
+        for i, entry in enumerate(result['entry_list']):
+            if self._get_entry_failed(entry):
+                continue
+            bean_list.append(
+                Bean(
+                    module_name,
+                    entry['name_value_list'],
+                    result['relationship_list'][i] if len(result['relationship_list']) > i else []
+                )
+            )
+        if start is not None:
+            self._beans_built('get_entries', start, len(bean_list))
+        return bean_list
+
+    def _get_entries(self, module_name, ids, select_fields='',
+                     link_name_to_fields_array='', track_view=''):
+        parameters = OrderedDict()
+        parameters['session'] = self._session_id
+        parameters['module_name'] = module_name
+        parameters['ids'] = ids
+        parameters['select_fields'] = select_fields
+        parameters['link_name_to_fields_array'] = link_name_to_fields_array
+        parameters['track_view'] = track_view
+        return self._request('get_entries', parameters)
+
+    @staticmethod
+    def _get_entry_failed(entry):
+        try:
+            return entry['name_value_list'][0]['name'] == 'warning'
+        except:
+            return False
+
+    def load_relationships(self, beans, link_name, related_fields=['id', 'name'], chunk_size=100):
+        """
+        Retrieve the records related to a list of Beans through a link using as few requests
+        as possible, instead of calling get_relationships for every Bean.
+
+        The related records are stored on each Bean, so they can be read
+        with bean[link_name] without making more requests.
+
+        :param list[Bean] beans: list of parent Beans.
+        :param str link_name: name of the link field to load.
+        :param list[str] related_fields: list of related bean fields to be retrieved.
+        :param int chunk_size: maximum number of parent Beans retrieved on each request.
+        :raises SuiteException: if error when retrieving relationships from SuiteCRM instance.
+        """
+        link_name_to_fields_array = [{'name': link_name, 'value': related_fields}]
+        beans_by_module = OrderedDict()
+        for bean in beans:
+            beans_by_id = beans_by_module.setdefault(bean.module, OrderedDict())
+            beans_by_id.setdefault(bean['id'], []).append(bean)
+            bean._relationship_list[link_name] = []
+        for module_name, beans_by_id in beans_by_module.items():
+            ids = list(beans_by_id.keys())
+            for start in range(0, len(ids), chunk_size):
+                result = self._get_entries(module_name, ids[start:start + chunk_size],
+                                           ['id'], link_name_to_fields_array)
+                for i, entry in enumerate(result['entry_list']):
+                    if self._get_entry_failed(entry) or len(result['relationship_list']) <= i:
+                        continue
+                    for bean in beans_by_id.get(entry['id'], []):
+                        bean._set_relationship_list(result['relationship_list'][i])
+
     def get_available_modules(self, filter='default'):
         """
         Retrieve the list of available modules on the system available to the currently logged in user.
@@ -265,6 +965,7 @@ class SuiteCRM(Singleton):
         parameters['offset'] = offset
         parameters['limit'] = limit
         result = self._request('get_relationships', parameters)
+        start = time.time() if self._instrumentation is not None else None
         bean_list = []
         for i, entry in enumerate(result['entry_list']):
             bean_list.append(
@@ -274,6 +975,8 @@ class SuiteCRM(Singleton):
                     result['relationship_list'][i] if len(result['relationship_list']) > i else []
                 )
             )
+        if start is not None:
+            self._beans_built('get_relationships', start, len(bean_list))
         previous_offset = None
         result_count = len(bean_list)
         if offset and limit and offset - limit >= 0:
@@ -293,6 +996,53 @@ class SuiteCRM(Singleton):
             "current_limit": limit
         }
 
+    def iter_relationships(self, module_name, module_id, link_field_name,
+                           related_module_query='', related_fields=[],
+                           related_module_link_name_to_fields_array=[], deleted=False,
+                           order_by='', offset=0, limit=None, prefetch=1):
+        """
+        Iterate over all the beans related to the specified bean, retrieving them page by page.
+
+        Pages are requested lazily and, while a page is being consumed, the following
+        pages are retrieved in background. At most prefetch pages are kept in memory.
+        The iteration stops when a page returns less records than requested.
+
+        :param str module_name: name of the module that the primary record is from.
+        :param str module_id: ID of the bean in the specified module.
+        :param str link_field_name: name of the link field to return records from.
+        :param str related_module_query: a portion of the where clause of the SQL statement to find the related items.
+        :param list[str] related_fields: list of related bean fields to be returned.
+        :param list[dict] related_module_link_name_to_fields_array: for every related bean returned,
+            specify link fields name to fields info for that bean to be returned.
+        :param bool deleted: False if deleted records should not be include,
+            True if deleted records should be included.
+        :param str order_by: SQL ORDER BY clause without the phrase 'ORDER BY'.
+        :param int offset: the result offset to start from.
+        :param int limit: the number of records retrieved on each request. If not specified,
+            it is tuned when adaptive page sizes are enabled, and 100 otherwise.
+        :param int prefetch: maximum number of pages retrieved in advance, 0 disables prefetching.
+        :return: generator of related Beans, including their relationship data.
+        :rtype: generator
+        :raises SuiteException: if error when retrieving beans from SuiteCRM instance.
+        """
+        parent_span = self._tracer.current_span() if self._tracer is not None else None
+
+        def fetch_page(page_offset):
+            with self._span('suitecrm.page', parent_span, method='get_relationships',
+                            module=module_name, offset=page_offset) as span:
+                page = self._fetch_sized_page(
+                    module_name + '.' + link_field_name, limit,
+                    lambda page_size: self.get_relationships(
+                        module_name, module_id, link_field_name, related_module_query,
+                        related_fields, related_module_link_name_to_fields_array, deleted,
+                        order_by, page_offset, page_size
+                    ))
+                span.set_attribute('result_count', page['result_count'])
+                return page
+        for page in iter_pages(self._bind_bulk_priority(fetch_page), offset, prefetch):
+            for bean in page['entry_list']:
+                yield bean
+
     def set_relationship(self, module_name, module_id, link_field_name,
                          related_ids, name_value_list=[], delete=False):
         """
@@ -320,6 +1070,120 @@ class SuiteCRM(Singleton):
         parameters['delete'] = delete
         return self._request('set_relationship', parameters)
 
+    def set_relationships(self, module_names, module_ids, link_field_names,
+                          related_ids, name_value_lists=[], delete_array=[]):
+        """
+        Set multiple relationships between beans using a single request.
+
+        :param list[str] module_names: names of the modules that the primary records are from.
+        :param list[str] module_ids: IDs of the beans in the specified modules.
+        :param list[str] link_field_names: names of the link fields which relate to the other modules.
+        :param list[list[str]] related_ids: lists of related record ids for each primary record.
+        :param list[list[dict]] name_value_lists: name value lists of relationship attributes
+            for each primary record.
+        :param list[bool] delete_array: for each primary record, True to delete the relationship
+            and False to add it.
+        :return: how many relationships are deleted, created and failed.
+        :rtype: dict[str, int]
+        :raises SuiteException: if error when relating beans.
+        """
+        parameters = OrderedDict()
+        parameters['session'] = self._session_id
+        parameters['module_names'] = module_names
+        parameters['module_ids'] = module_ids
+        parameters['link_field_names'] = link_field_names
+        parameters['related_ids'] = related_ids
+        parameters['name_value_lists'] = name_value_lists
+        parameters['delete_array'] = delete_array
+        return self._request('set_relationships', parameters)
+
+    def set_relationships_bulk(self, relationships, delete=False, name_value_list=[],
+                               chunk_size=100, max_workers=1):
+        """
+        Set a large number of relationships using as few requests as possible.
+
+        Relationships are grouped by primary record and link field, duplicated related ids
+        are removed and the result is split in chunks of at most chunk_size related ids,
+        which are sent using set_relationships.
+
+        SuiteCRM reports the number of created, failed and deleted relationships for each
+        request, so the counts are returned in total and for each chunk. When the request
+        of a chunk fails, all its relationships are counted as failed.
+
+        :param iterable relationships: (module_name, module_id, link_field_name, related_ids) tuples,
+            where related_ids is a related record id or a list of them.
+        :param bool delete: if True delete the relationships and if False add them.
+        :param dict[str, str] name_value_list: relationship attributes set on all the relationships.
+        :param int chunk_size: maximum number of related ids sent on each request.
+        :param int max_workers: number of chunks sent concurrently.
+        :return: dict containing created, failed and deleted totals, and the result of each chunk.
+        :rtype: dict[str, object]
+        """
+        grouped = OrderedDict()
+        for module_name, module_id, link_field_name, related_ids in relationships:
+            if isinstance(related_ids, basestring):
+                related_ids = [related_ids]
+            ids = grouped.setdefault((module_name, module_id, link_field_name), OrderedDict())
+            for related_id in related_ids:
+                ids[related_id] = True
+        chunks = []
+        chunk = []
+        chunk_length = 0
+        for key, ids in grouped.items():
+            ids = list(ids.keys())
+            while ids:
+                size = chunk_size - chunk_length
+                chunk.append(key + (ids[:size],))
+                chunk_length += len(ids[:size])
+                ids = ids[size:]
+                if chunk_length >= chunk_size:
+                    chunks.append(chunk)
+                    chunk = []
+                    chunk_length = 0
+        if chunk:
+            chunks.append(chunk)
+
+        def send_chunk(chunk):
+            return self.set_relationships(
+                [relationship[0] for relationship in chunk],
+                [relationship[1] for relationship in chunk],
+                [relationship[2] for relationship in chunk],
+                [relationship[3] for relationship in chunk],
+                [name_value_list for _ in chunk],
+                [delete for _ in chunk]
+            )
+        send_chunk = self._bind_bulk_priority(send_chunk)
+
+        if max_workers > 1 and len(chunks) > 1:
+            pool = ThreadPool(max_workers)
+            try:
+                results = pool.map(send_chunk, chunks)
+            finally:
+                pool.shutdown()
+        else:
+            results = []
+            for chunk in chunks:
+                try:
+                    results.append((send_chunk(chunk), None))
+                except Exception as e:
+                    results.append((None, e))
+        totals = {'created': 0, 'failed': 0, 'deleted': 0}
+        chunk_results = []
+        for chunk, (result, error) in zip(chunks, results):
+            if error is not None:
+                result = {
+                    'created': 0,
+                    'failed': sum(len(relationship[3]) for relationship in chunk),
+                    'deleted': 0
+                }
+            chunk_result = {'relationships': chunk, 'error': error}
+            for count in totals:
+                chunk_result[count] = int(result.get(count, 0) or 0)
+                totals[count] += chunk_result[count]
+            chunk_results.append(chunk_result)
+        totals['chunks'] = chunk_results
+        return totals
+
     def get_note_attachment(self, note_id):
         """
         Retrieve an attachment from a note.
@@ -354,6 +1218,79 @@ class SuiteCRM(Singleton):
         }
         return self._request('set_note_attachment', parameters)
 
+    def get_note_attachment_to_file(self, note_id, file):
+        """
+        Retrieve an attachment from a note writing its contents to a file.
+
+        The attachment is decoded while it is being received,
+        so it is never fully loaded in memory.
+
+        :param str note_id: ID of the appropriate Note.
+        :param file: path of the destination file or a binary file object.
+        :return: the attachment information, without the file contents.
+        :rtype: dict[str, object]
+        :raises SuiteException: if error when retrieving the attachment from SuiteCRM instance.
+        """
+        if isinstance(file, basestring):
+            with open(file, 'wb') as f:
+                return self.get_note_attachment_to_file(note_id, f)
+        parameters = OrderedDict()
+        parameters['session'] = self._session_id
+        parameters['id'] = note_id
+        return self._request('get_note_attachment', parameters,
+                             self._get_download_call(file, 'file'))
+
+    def _get_download_call(self, file, field_name):
+        def call(method, parameters):
+            r = self._post(self._encode_request(method, parameters), stream=True)
+            decoder = Base64FieldDecoder(field_name, file)
+            for chunk in r.iter_content(BLOCK_SIZE):
+                decoder.feed(chunk)
+            return self._decode_response(decoder.text)
+        return call
+
+    def set_note_attachment_from_file(self, note_id, filename, file):
+        """
+        Add or replace the attachment on a Note reading its contents from a file.
+
+        The file is encoded while it is being sent, so it is never fully loaded in memory.
+
+        :param str note_id: ID of the Note containing the attachment.
+        :param str filename: the file name of the attachment.
+        :param file: path of the file or a seekable binary file object.
+        :return: the ID of the note.
+        :rtype: dict[str, str]
+        :raises SuiteException: if error when setting the note attachment.
+        """
+        if isinstance(file, basestring):
+            with open(file, 'rb') as f:
+                return self.set_note_attachment_from_file(note_id, filename, f)
+        parameters = OrderedDict()
+        parameters['session'] = self._session_id
+        parameters['note'] = OrderedDict()
+        parameters['note']['id'] = note_id
+        parameters['note']['filename'] = filename
+        parameters['note']['file'] = self._file_placeholder
+        return self._request('set_note_attachment', parameters, self._get_upload_call(file))
+
+    def _get_upload_call(self, file):
+        start = file.tell()
+
+        def call(method, parameters):
+            rest_data = json.dumps(parameters, separators=(',', ':')).split(
+                json.dumps(self._file_placeholder))
+            prefix = urllib.urlencode([
+                ('method', method),
+                ('input_type', 'JSON'),
+                ('response_type', 'JSON'),
+                ('rest_data', rest_data[0] + '"')
+            ])
+            file.seek(start)
+            body = Base64FormBody(prefix, file, urllib.quote_plus('"' + rest_data[1]))
+            r = self._post(body, headers={'Content-Type': 'application/x-www-form-urlencoded'})
+            return self._decode_response(r.text)
+        return call
+
     def get_pdf_template(self, template_id, bean_module, bean_id):
         """
         Retrieve PDF Template for a given module record.
@@ -371,3 +1308,101 @@ class SuiteCRM(Singleton):
         parameters['bean_module'] = bean_module
         parameters['bean_id'] = bean_id
         return self._request('get_pdf_template', parameters)
+
+    def get_pdf_template_to_file(self, template_id, bean_module, bean_id, file, pdf_field='file'):
+        """
+        Retrieve PDF Template for a given module record writing the decoded PDF to a file.
+
+        The PDF is decoded while it is being received, so it is never fully loaded in memory.
+
+        :param str template_id: template ID used to generate PDF.
+        :param str bean_module: module name of the bean that will be used to populate PDF.
+        :param str bean_id: ID of the bean record.
+        :param file: path of the destination file or a binary file object.
+        :param str pdf_field: name of the response field that contains the base64 encoded PDF.
+        :return: the response without the PDF contents.
+        :rtype: dict[str, str]
+        :raises SuiteException: if error when retrieving PDF.
+        """
+        if isinstance(file, basestring):
+            with open(file, 'wb') as f:
+                return self.get_pdf_template_to_file(template_id, bean_module, bean_id, f, pdf_field)
+        parameters = OrderedDict()
+        parameters['session'] = self._session_id
+        parameters['template_id'] = template_id
+        parameters['bean_module'] = bean_module
+        parameters['bean_id'] = bean_id
+        return self._request('get_pdf_template', parameters,
+                             self._get_download_call(file, pdf_field))
+
+    def get_pdf_templates(self, templates, output_dir=None, callback=None,
+                          max_workers=4, pdf_field='file', filename=None):
+        """
+        Generate PDF Templates for many module records concurrently.
+
+        When output_dir is specified, each PDF is decoded to a temporary file of
+        output_dir while it is being received, and then renamed to
+        <output_dir>/<template_id>_<bean_module>_<bean_id>.pdf, or to the name
+        returned by filename. Repeated triples are only generated once. Otherwise, the decoded PDF contents are passed to the callback.
+        The callback is called as soon as each PDF is generated, from the thread that
+        generated it, with the (template_id, bean_module, bean_id) triple and the path
+        of the PDF file or its contents.
+
+        :param iterable templates: (template_id, bean_module, bean_id) triples.
+        :param str output_dir: directory where PDF files are written.
+        :param function callback: function called for every generated PDF.
+        :param int max_workers: maximum number of PDFs generated concurrently.
+        :param str pdf_field: name of the response field that contains the base64 encoded PDF.
+        :param function filename: function that receives a triple and returns the name
+            of its PDF file in output_dir.
+        :return: dict containing the list of generated triples and the list of
+            (triple, exception) tuples of the failed ones.
+        :rtype: dict[str, list]
+        """
+        def generate(template):
+            template_id, bean_module, bean_id = template
+            if output_dir:
+                name = filename(template) if filename else \
+                    '%s_%s_%s.pdf' % (template_id, bean_module, bean_id)
+                path = os.path.join(output_dir, name)
+                fd, temporary_path = tempfile.mkstemp(dir=output_dir, suffix='.part')
+                try:
+                    with os.fdopen(fd, 'wb') as f:
+                        self.get_pdf_template_to_file(template_id, bean_module, bean_id,
+                                                      f, pdf_field)
+                    os.rename(temporary_path, path)
+                except Exception:
+                    if os.path.exists(temporary_path):
+                        os.remove(temporary_path)
+                    raise
+                pdf = path
+            else:
+                pdf = base64.b64decode(
+                    self.get_pdf_template(template_id, bean_module, bean_id)[pdf_field])
+            if callback:
+                callback(template, pdf)
+
+        def unique(templates):
+            seen = set()
+            for template in templates:
+                template = tuple(template)
+                if template not in seen:
+                    seen.add(template)
+                    yield template
+
+        generate = self._bind_bulk_priority(generate)
+        generated = []
+        failed = []
+        pool = ThreadPool(max_workers)
+        try:
+            for template, _, error in pool.imap_unordered(generate, unique(templates)):
+                if error is None:
+                    generated.append(template)
+                else:
+                    failed.append((template, error))
+        finally:
+            pool.shutdown()
+        return {
+            "generated": generated,
+            "failed": failed
+        }
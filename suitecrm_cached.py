@@ -19,10 +19,18 @@
 #######################################################################
 
 import json
+import threading
 import time
+from suite_exceptions import ModuleDoesNotExistException, SuiteException
 from suitecrm import SuiteCRM
+from thread_pool import ThreadPool
 from collections import OrderedDict
 
+# Read methods that can be refreshed in background when stale or hot,
+# as sending them again has no side effects.
+REFRESHABLE_METHODS = ('get_entry', 'get_entries', 'get_entry_list', 'get_module_fields',
+                       'get_available_modules', 'get_relationships')
+
 
 class SuiteCRMCached(SuiteCRM):
     """
@@ -33,6 +41,19 @@ class SuiteCRMCached(SuiteCRM):
 
     The cache has a limit of cached requests, when this limit is reached,
     the request that has not been accessed for a longer time is eliminated.
+    Writes, like set_entry or set_relationship, are never cached, nor are the counts
+    of count_beans, which keeps its own cache.
+
+    By default cached requests never expire. With set_cache_policy, requests expire
+    after a time to live, and can be served stale for a grace period while they are
+    refreshed in background (stale-while-revalidate). Frequently hit requests can also
+    be refreshed in background before they expire (refresh-ahead), so they never make
+    the caller wait for SuiteCRM.
+
+    Lookups of beans that don't exist and calls to modules that don't exist are kept
+    apart, on a negative cache with a short time to live and its own capacity, so
+    repeated probes for missing IDs don't reach SuiteCRM. Saving a bean removes its
+    ID from the negative cache.
 
     This class allows you to make the same calls as the SuiteCRM class.
     Its the responsibility of the programmer to determine when to
@@ -41,42 +62,168 @@ class SuiteCRMCached(SuiteCRM):
     the existing information on the SuiteCRM instance.
     """
 
-    _cache = {}
-    _cache_accessed = {}
     _max_cached_requests = 100
+    _cache_ttl = None
+    _stale_ttl = 0
+    _refresh_ahead = 0
+    _refresh_ahead_hits = 3
+    _negative_ttl = 60
+    _max_negative_entries = 1000
+
+    def __init__(self, conf=None, transport=None):
+        if '_cache' not in self.__dict__:
+            self._cache = {}
+            self._cache_accessed = {}
+            self._cache_stored = {}
+            self._cache_hits = {}
+            self._cache_lock = threading.RLock()
+            self._refreshing = set()
+            self._refresh_pool = None
+            self._negative_cache = OrderedDict()
+            self._negative_stats = dict.fromkeys(
+                ('hits', 'misses', 'stored', 'evicted', 'invalidated'), 0)
+        super(SuiteCRMCached, self).__init__(conf, transport)
+
+    def set_cache_policy(self, ttl=None, stale_ttl=0, refresh_ahead=0, refresh_ahead_hits=3,
+                         max_workers=2):
+        """
+        Set when cached requests expire and how they are refreshed.
+
+        :param float ttl: seconds a cached request is fresh, None if it never expires.
+        :param float stale_ttl: seconds an expired request is still served while it is
+            refreshed in background.
+        :param float refresh_ahead: fraction of the ttl before the expiration when hot
+            requests are refreshed in background, for example 0.2. 0 disables refresh-ahead.
+        :param int refresh_ahead_hits: number of hits that make a cached request hot.
+        :param int max_workers: number of threads refreshing requests in background.
+        """
+        self._cache_ttl = ttl
+        self._stale_ttl = stale_ttl
+        self._refresh_ahead = refresh_ahead
+        self._refresh_ahead_hits = refresh_ahead_hits
+        with self._cache_lock:
+            if self._refresh_pool is not None:
+                self._refresh_pool.shutdown()
+            self._refresh_pool = ThreadPool(max_workers) if stale_ttl or refresh_ahead else None
+
+    def set_negative_cache_policy(self, ttl=60, capacity=1000):
+        """
+        Set how long missing beans and modules are remembered.
+
+        :param float ttl: seconds a missing bean or module is remembered, 0 disables
+            the negative cache.
+        :param int capacity: maximum number of remembered missing beans and modules.
+        """
+        self._negative_ttl = ttl
+        self._max_negative_entries = capacity
+        with self._cache_lock:
+            while len(self._negative_cache) > capacity:
+                self._negative_cache.popitem(last=False)
+
+    def get_negative_cache_stats(self):
+        """
+        Get the counters of the negative cache.
+
+        :return: dict with the number of entries and the number of hits, misses,
+            stored, evicted and invalidated entries.
+        :rtype: dict[str, int]
+        """
+        with self._cache_lock:
+            stats = dict(self._negative_stats)
+            stats['entries'] = len(self._negative_cache)
+        return stats
 
     def _login(self):
-        login_parameters = OrderedDict()
-        login_parameters['user_auth'] = {
-            'user_name': self.conf.username,
-            'password': self._md5(self.conf.password)
-        }
-        login_parameters['application_name'] = self.conf.application_name
-        login_result = super(SuiteCRMCached, self)._call('login', login_parameters)
+        login_result = super(SuiteCRMCached, self)._call('login', self._get_login_parameters())
         self._session_id = login_result['id']
 
+    @staticmethod
+    def _is_cacheable(method):
+        # Counts have their own short lived cache, invalidated on saves, in count_beans.
+        return not method.startswith('set_') and method != 'get_entries_count'
+
     def _call(self, method, parameters):
+        if not self._is_cacheable(method):
+            return self._call_uncached(method, parameters)
+        if self._negative_ttl:
+            negative_response = self._get_negative_cached_call(method, parameters)
+            if negative_response is not None:
+                return negative_response
         cached_call = self._get_cached_call(method, parameters)
+        if self._instrumentation is not None:
+            self._instrumentation.emit('cache_hit' if cached_call else 'cache_miss', method=method)
         if cached_call:
             return cached_call
-        else:
+        try:
             response = super(SuiteCRMCached, self)._call(method, parameters)
-            self._add_call_to_cache(method, parameters, response)
+        except ModuleDoesNotExistException as e:
+            if self._negative_ttl:
+                self._add_negative_call(('module', parameters.get('module_name')), {
+                    'name': e.name, 'description': e.description, 'number': e.number
+                })
+            raise
+        if method == 'get_entry' and self._get_bean_failed(response):
+            if self._negative_ttl:
+                self._add_negative_call(
+                    ('bean', parameters.get('module_name'), parameters.get('id')), response)
             return response
+        self._add_call_to_cache(method, parameters, response)
+        return response
+
+    def _call_uncached(self, method, parameters):
+        response = super(SuiteCRMCached, self)._call(method, parameters)
+        if method in ('set_entry', 'set_entries') and self._negative_cache:
+            self._invalidate_negative_calls(parameters.get('module_name'),
+                                            [response.get('id')] + list(response.get('ids') or []))
+        return response
+
+    def _get_negative_cached_call(self, method, parameters):
+        if 'module_name' not in parameters:
+            return None
+        keys = [('module', parameters['module_name'])]
+        if method == 'get_entry':
+            keys.append(('bean', parameters['module_name'], parameters.get('id')))
+        now = self._get_time()
+        with self._cache_lock:
+            for key in keys:
+                entry = self._negative_cache.get(key)
+                if entry is not None and entry[0] <= now:
+                    del self._negative_cache[key]
+                    entry = None
+                if entry is not None:
+                    self._negative_stats['hits'] += 1
+                    break
+            else:
+                self._negative_stats['misses'] += 1
+                return None
+        if self._instrumentation is not None:
+            self._instrumentation.emit('negative_cache_hit', method=method)
+        if key[0] == 'module':
+            raise SuiteException.get_suite_exception(entry[1])
+        return entry[1]
+
+    def _add_negative_call(self, key, response):
+        with self._cache_lock:
+            self._negative_cache.pop(key, None)
+            self._negative_cache[key] = (self._get_time() + self._negative_ttl, response)
+            self._negative_stats['stored'] += 1
+            while len(self._negative_cache) > self._max_negative_entries:
+                self._negative_cache.popitem(last=False)
+                self._negative_stats['evicted'] += 1
+
+    def _invalidate_negative_calls(self, module_name, ids):
+        with self._cache_lock:
+            for id in ids:
+                if self._negative_cache.pop(('bean', module_name, id), None) is not None:
+                    self._negative_stats['invalidated'] += 1
 
     def _get_time(self):
         return time.time()
 
     def _get_oldest_accessed_cache_key(self):
         try:
-            oldest_accessed = None
-            for key, timestamp in self._cache_accessed.items():
-                if oldest_accessed and oldest_accessed[1] > timestamp:
-                    oldest_accessed = (key, timestamp)
-                else:
-                    oldest_accessed = (key, timestamp)
-            return oldest_accessed[0]
-        except:
+            return min(self._cache_accessed, key=self._cache_accessed.get)
+        except ValueError:
             return None
 
     def _remove_oldest_cached_requests(self):
@@ -85,32 +232,88 @@ class SuiteCRMCached(SuiteCRM):
             if oldest_accessed:
                 del self._cache[oldest_accessed]
                 del self._cache_accessed[oldest_accessed]
+                del self._cache_stored[oldest_accessed]
+                self._cache_hits.pop(oldest_accessed, None)
+
+    @staticmethod
+    def _get_cache_key(method, parameters):
+        return method, json.dumps(parameters)
 
     def _add_call_to_cache(self, method, parameters, response):
         try:
-            key = (method, json.dumps(parameters))
-            self._cache[key] = response
-            self._cache_accessed[key] = self._get_time()
-            self._remove_oldest_cached_requests()
+            key = self._get_cache_key(method, parameters)
+            with self._cache_lock:
+                self._cache[key] = response
+                self._cache_accessed[key] = self._cache_stored[key] = self._get_time()
+                self._cache_hits.pop(key, None)
+                self._remove_oldest_cached_requests()
             return True
         except:
             return False
 
     def _get_cached_call(self, method, parameters):
         try:
-            key = (method, json.dumps(parameters))
-            cached_response = self._cache[key]
-            self._cache_accessed[key] = self._get_time()
-            return cached_response
+            key = self._get_cache_key(method, parameters)
+            now = self._get_time()
+            with self._cache_lock:
+                cached_response = self._cache[key]
+                self._cache_accessed[key] = now
+                hits = self._cache_hits[key] = self._cache_hits.get(key, 0) + 1
+                age = now - self._cache_stored[key]
         except:
             return None
+        ttl = self._cache_ttl
+        if ttl is None:
+            return cached_response
+        if age >= ttl:
+            if age >= ttl + self._stale_ttl or method not in REFRESHABLE_METHODS:
+                return None
+            if self._instrumentation is not None:
+                self._instrumentation.emit('cache_stale', method=method)
+            self._refresh(key, method, parameters, 'stale')
+        elif self._refresh_ahead and hits >= self._refresh_ahead_hits \
+                and age >= ttl * (1 - self._refresh_ahead):
+            self._refresh(key, method, parameters, 'ahead')
+        return cached_response
+
+    def _refresh(self, key, method, parameters, reason):
+        with self._cache_lock:
+            pool = self._refresh_pool
+            if pool is None or method not in REFRESHABLE_METHODS or key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        parameters = OrderedDict(parameters)
+        pool.submit(self._refresh_call, key, method, parameters, reason)
+
+    def _refresh_call(self, key, method, parameters, reason):
+        error = None
+        try:
+            if 'session' in parameters:
+                parameters['session'] = self._session_id
+            response = self._request(method, parameters, super(SuiteCRMCached, self)._call)
+            with self._cache_lock:
+                if key in self._cache:
+                    self._cache[key] = response
+                    self._cache_stored[key] = self._get_time()
+                    self._cache_hits[key] = 0
+        except Exception as e:
+            error = e
+        finally:
+            with self._cache_lock:
+                self._refreshing.discard(key)
+        if self._instrumentation is not None:
+            self._instrumentation.emit('cache_refresh', method=method, reason=reason, error=error)
 
     def clear_cache(self):
         """
         This method clears all the information stored on the internal cache.
         """
-        self._cache.clear()
-        self._cache_accessed.clear()
+        with self._cache_lock:
+            self._cache.clear()
+            self._cache_accessed.clear()
+            self._cache_stored.clear()
+            self._cache_hits.clear()
+            self._negative_cache.clear()
 
     def get_number_of_cached_calls(self):
         """
@@ -0,0 +1,227 @@
+#######################################################################
+# Suite PY is a simple Python client for SuiteCRM API.
+
+# Copyright (C) 2017-2018 BTACTIC, SCCL
+# Copyright (C) 2017-2018 Marc Sanchez Fauste
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#######################################################################
+
+import threading
+from Queue import Queue
+
+
+class Future(object):
+    """
+    This class represents the result of a task submitted to a ThreadPool.
+    """
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._result = None
+        self._error = None
+        self._callbacks = []
+
+    def _set_result(self, result, error=None):
+        with self._lock:
+            self._result = result
+            self._error = error
+            self._done.set()
+            callbacks = self._callbacks
+            self._callbacks = []
+        for callback in callbacks:
+            callback(self)
+
+    def add_done_callback(self, callback):
+        """
+        Add a function that will be called with this Future when the task is done.
+        If the task is already done the function is called immediately.
+
+        :param function callback: function that receives the Future.
+        """
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def done(self):
+        """
+        Check whether the task is done.
+
+        :return: True if the task is done, False otherwise.
+        :rtype: bool
+        """
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """
+        Wait until the task is done.
+
+        :param float timeout: maximum number of seconds to wait, None to wait forever.
+        :return: True if the task is done, False otherwise.
+        :rtype: bool
+        """
+        self._done.wait(timeout)
+        return self._done.is_set()
+
+    def exception(self, timeout=None):
+        """
+        Get the exception raised by the task.
+
+        :param float timeout: maximum number of seconds to wait, None to wait forever.
+        :return: the exception raised by the task or None.
+        :rtype: Exception
+        """
+        self.wait(timeout)
+        return self._error
+
+    def result(self, timeout=None):
+        """
+        Get the value returned by the task.
+
+        :param float timeout: maximum number of seconds to wait, None to wait forever.
+        :return: the value returned by the task.
+        :raises Exception: the exception raised by the task, if any.
+        """
+        self.wait(timeout)
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class ThreadPool(object):
+    """
+    This class runs tasks concurrently on a bounded number of worker threads.
+
+    Worker threads are started when needed. A task must not wait for
+    other tasks submitted to the same pool, as it may never run.
+    """
+
+    def __init__(self, max_workers=4):
+        """
+        Creates a ThreadPool instance.
+
+        :param int max_workers: maximum number of worker threads.
+        """
+        self._max_workers = max(1, max_workers)
+        self._tasks = Queue()
+        self._workers = []
+        self._idle_workers = 0
+        self._lock = threading.Lock()
+
+    @property
+    def max_workers(self):
+        """
+        Get the maximum number of worker threads.
+
+        :return: maximum number of worker threads.
+        :rtype: int
+        """
+        return self._max_workers
+
+    def submit(self, function, *args, **kwargs):
+        """
+        Schedule a function to be run on a worker thread.
+
+        :param function function: function to run.
+        :return: the Future of the task.
+        :rtype: Future
+        """
+        future = Future()
+        with self._lock:
+            self._tasks.put((future, function, args, kwargs))
+            if self._idle_workers:
+                self._idle_workers -= 1
+            elif len(self._workers) < self._max_workers:
+                worker = threading.Thread(target=self._work)
+                worker.daemon = True
+                self._workers.append(worker)
+                worker.start()
+        return future
+
+    def _work(self):
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                return
+            future, function, args, kwargs = task
+            try:
+                future._set_result(function(*args, **kwargs))
+            except Exception as e:
+                future._set_result(None, e)
+            with self._lock:
+                self._idle_workers += 1
+
+    def imap_unordered(self, function, items):
+        """
+        Run a function for every item and yield the results as they are completed.
+
+        Items are consumed lazily, keeping at most twice the number
+        of workers waiting to be run.
+
+        :param function function: function that receives an item.
+        :param iterable items: items to process.
+        :return: generator of (item, result, error) tuples.
+        :rtype: generator
+        """
+        completed = Queue()
+        items = iter(items)
+        pending = 0
+        exhausted = False
+        while True:
+            while not exhausted and pending < 2 * self._max_workers:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                future = self.submit(function, item)
+                future.add_done_callback(lambda f, item=item: completed.put((item, f)))
+                pending += 1
+            if not pending:
+                return
+            item, future = completed.get()
+            pending -= 1
+            yield item, future._result, future._error
+
+    def map(self, function, items):
+        """
+        Run a function for every item and return the results in the order of the items.
+
+        :param function function: function that receives an item.
+        :param iterable items: items to process.
+        :return: list of (result, error) tuples.
+        :rtype: list[tuple]
+        """
+        futures = [self.submit(function, item) for item in items]
+        return [(future.result() if future.exception() is None else None, future.exception())
+                for future in futures]
+
+    def shutdown(self, wait=True):
+        """
+        Stop the worker threads once the scheduled tasks are done.
+
+        :param bool wait: wait until the worker threads are stopped.
+        """
+        with self._lock:
+            workers = self._workers
+            self._workers = []
+            self._idle_workers = 0
+            for _ in workers:
+                self._tasks.put(None)
+        if wait:
+            for worker in workers:
+                worker.join()
@@ -0,0 +1,246 @@
+#######################################################################
+# Suite PY is a simple Python client for SuiteCRM API.
+
+# Copyright (C) 2017-2018 BTACTIC, SCCL
+# Copyright (C) 2017-2018 Marc Sanchez Fauste
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#######################################################################
+
+import json
+import logging
+import random
+import threading
+import time
+
+
+class Span(object):
+    """
+    This class represents a timed operation of a trace.
+
+    Spans are used as context managers: the span starts when the block is
+    entered and it is finished and exported when the block is exited.
+    """
+
+    def __init__(self, tracer, name, parent=None, attributes=None):
+        self._tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else '%032x' % random.getrandbits(128)
+        self.span_id = '%016x' % random.getrandbits(64)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = dict(attributes or {})
+        self.error = None
+        self.start_time = None
+        self.end_time = None
+
+    def set_attribute(self, key, value):
+        """
+        Set an attribute of the span.
+
+        :param str key: name of the attribute.
+        :param object value: value of the attribute.
+        """
+        self.attributes[key] = value
+
+    @property
+    def duration(self):
+        """
+        Get the duration of the span.
+
+        :return: duration in seconds, or None if the span is not finished.
+        :rtype: float
+        """
+        if self.end_time is None:
+            return None
+        return self.end_time - self.start_time
+
+    def to_dict(self):
+        """
+        Get a dict representation of the span.
+
+        :return: dict containing all the span information.
+        :rtype: dict[str, object]
+        """
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "attributes": self.attributes,
+            "error": repr(self.error) if self.error is not None else None
+        }
+
+    def __enter__(self):
+        self.start_time = time.time()
+        self._tracer._push(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.end_time = time.time()
+        if exc_value is not None:
+            self.error = exc_value
+        self._tracer._pop(self)
+        self._tracer._export(self)
+        return False
+
+
+class _NoopSpan(object):
+
+    def set_attribute(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Tracer(object):
+    """
+    This class creates spans and sends the finished ones to its exporters.
+
+    The current span is tracked per thread, so spans started inside another span
+    become its children. Spans started on other threads can specify its parent.
+    """
+
+    def __init__(self, exporters=None):
+        """
+        Creates a Tracer instance.
+
+        :param list exporters: objects with an export(span) method that receive finished spans.
+        """
+        self._exporters = list(exporters or [])
+        self._local = threading.local()
+
+    def add_exporter(self, exporter):
+        """
+        Add an exporter that will receive the finished spans.
+
+        :param exporter: object with an export(span) method.
+        """
+        self._exporters.append(exporter)
+
+    def start_span(self, name, parent=None, **attributes):
+        """
+        Create a span, to be used as a context manager.
+
+        :param str name: name of the span.
+        :param Span parent: parent span, by default the current span of the thread.
+        :return: the new span.
+        :rtype: Span
+        """
+        if parent is None:
+            parent = self.current_span()
+        return Span(self, name, parent, attributes)
+
+    def current_span(self):
+        """
+        Get the innermost active span of the current thread.
+
+        :return: the current span or None.
+        :rtype: Span
+        """
+        stack = getattr(self._local, 'stack', None)
+        return stack[-1] if stack else None
+
+    def _push(self, span):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        self._local.stack.append(span)
+
+    def _pop(self, span):
+        stack = getattr(self._local, 'stack', [])
+        if span in stack:
+            stack.remove(span)
+
+    def _export(self, span):
+        for exporter in self._exporters:
+            exporter.export(span)
+
+
+class InMemorySpanExporter(object):
+    """
+    This class keeps the finished spans in memory, which is useful for tests.
+    """
+
+    def __init__(self):
+        self._spans = []
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        with self._lock:
+            self._spans.append(span)
+
+    def get_finished_spans(self):
+        """
+        Get the spans exported so far.
+
+        :return: list of finished spans, in the order they finished.
+        :rtype: list[Span]
+        """
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self):
+        """
+        Discard all the exported spans.
+        """
+        with self._lock:
+            del self._spans[:]
+
+
+class LoggingSpanExporter(object):
+    """
+    This class writes the finished spans to a logger.
+    """
+
+    def __init__(self, logger=None, level=logging.DEBUG):
+        """
+        Creates a LoggingSpanExporter instance.
+
+        :param logging.Logger logger: logger used, by default the suitepy.tracing logger.
+        :param int level: logging level of the messages.
+        """
+        self._logger = logger or logging.getLogger('suitepy.tracing')
+        self._level = level
+
+    def export(self, span):
+        self._logger.log(self._level, '%s %.6fs %s', span.name, span.duration, span.attributes)
+
+
+class JSONLinesSpanExporter(object):
+    """
+    This class appends the finished spans as JSON lines to a file.
+    """
+
+    def __init__(self, path):
+        """
+        Creates a JSONLinesSpanExporter instance.
+
+        :param str path: path of the file where spans are appended.
+        """
+        self._path = path
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            with open(self._path, 'a') as f:
+                f.write(line + '\n')
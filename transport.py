@@ -0,0 +1,295 @@
+#######################################################################
+# Suite PY is a simple Python client for SuiteCRM API.
+
+# Copyright (C) 2017-2018 BTACTIC, SCCL
+# Copyright (C) 2017-2018 Marc Sanchez Fauste
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#######################################################################
+
+import gzip
+import json
+import threading
+import time
+import urllib
+from collections import OrderedDict, deque
+
+from request_encoder import RequestEncoder
+
+
+class HTTPTransport(object):
+    """
+    This class sends the requests of a SuiteCRM client over HTTP,
+    reusing connections through a requests Session.
+    """
+
+    def __init__(self, session=None, max_connections=None, limiter=None, encoder=None):
+        """
+        Creates a HTTPTransport instance.
+
+        :param requests.Session session: session used to send requests.
+        :param int max_connections: maximum number of connections kept open by the session.
+        :param threading.Semaphore limiter: semaphore acquired while a request is being sent,
+            which can be shared by several transports to bound their concurrent requests.
+        :param RequestEncoder encoder: encoder of the form fields of the requests,
+            by default a RequestEncoder without compression.
+        """
+        if session is None:
+            # requests is imported on first use, it takes most of the import time of the client.
+            import requests.adapters
+            session = requests.Session()
+            if max_connections:
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                                        pool_maxsize=max_connections)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+        self.session = session
+        self._limiter = limiter
+        self.encoder = encoder if encoder is not None else RequestEncoder()
+
+    def post(self, url, data, **kwargs):
+        """
+        Send a POST request.
+
+        :param str url: URL of the SuiteCRM API.
+        :param data: form fields or body of the request.
+        :return: the response.
+        :rtype: requests.Response
+        """
+        if isinstance(data, dict):
+            data, headers = self.encoder.encode(data)
+            headers.update(kwargs.get('headers') or {})
+            kwargs['headers'] = headers
+        if self._limiter is None:
+            return self.session.post(url, data=data, **kwargs)
+        with self._limiter:
+            return self.session.post(url, data=data, **kwargs)
+
+    def close(self):
+        """
+        Close the connections of the session.
+        """
+        self.session.close()
+
+
+# Session ID written to the log instead of the one returned by login.
+RECORDED_SESSION_ID = 'recorded-session'
+
+
+def _call_key(method, rest_data):
+    if method == 'login':
+        # Logins are matched by method alone, their credentials are never recorded.
+        return method, ''
+    try:
+        parameters = json.loads(rest_data, object_pairs_hook=OrderedDict)
+    except (TypeError, ValueError):
+        return method, rest_data
+    if isinstance(parameters, dict):
+        parameters.pop('session', None)
+    return method, json.dumps(parameters, separators=(',', ':'))
+
+
+class RecordingTransport(object):
+    """
+    This class records the calls sent through another transport to a
+    gzip compressed log of JSON lines, keeping the method, the parameters,
+    the response and the timing of every call.
+
+    Session IDs and login credentials are not recorded, so logs captured from
+    production can be shared: the parameters of logins are left out and the
+    session ID they return is replaced.
+
+    Requests whose body is not a dict of form fields, like streamed
+    attachments, are sent without being recorded.
+    """
+
+    def __init__(self, transport, path):
+        """
+        Creates a RecordingTransport instance.
+
+        :param transport: transport used to send the requests.
+        :param str path: path of the log file.
+        """
+        self._transport = transport
+        self._file = gzip.open(path, 'wb')
+        self._lock = threading.Lock()
+        self._start = time.time()
+
+    def post(self, url, data, **kwargs):
+        if not isinstance(data, dict):
+            return self._transport.post(url, data, **kwargs)
+        start = time.time()
+        response = self._transport.post(url, data, **kwargs)
+        entry = {
+            'time': start - self._start,
+            'elapsed': time.time() - start,
+            'method': data.get('method'),
+            'parameters': _call_key(data.get('method'), data.get('rest_data'))[1],
+            'status': response.status_code,
+            'response': _redact_response(data.get('method'), response.text)
+        }
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+        with self._lock:
+            self._file.write(line.encode('utf8'))
+        return response
+
+    def close(self):
+        """
+        Flush and close the log file.
+        """
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def _redact_response(method, text):
+    if method != 'login':
+        return text
+    try:
+        response = json.loads(text, object_pairs_hook=OrderedDict)
+    except ValueError:
+        return text
+    if isinstance(response, dict) and 'id' in response:
+        response['id'] = RECORDED_SESSION_ID
+    return json.dumps(response, separators=(',', ':'))
+
+
+def read_log(path):
+    """
+    Read the calls recorded by a RecordingTransport.
+
+    :param str path: path of the log file.
+    :return: list of recorded calls, in order.
+    :rtype: list[dict]
+    """
+    with gzip.open(path, 'rb') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class ReplayMissError(LookupError):
+    """
+    Exception raised when a replayed call was not recorded.
+    """
+    pass
+
+
+class ReplayResponse(object):
+    """
+    This class is a response replayed from a recorded call.
+    """
+
+    def __init__(self, entry, body):
+        self.status_code = entry['status']
+        self.text = entry['response']
+        self.content = self.text.encode('utf8')
+        self.request = _ReplayRequest(body)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            import requests
+            raise requests.HTTPError('%d replayed error' % self.status_code, response=self)
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+
+class _ReplayRequest(object):
+
+    def __init__(self, body):
+        self.body = body
+
+
+class ReplayTransport(object):
+    """
+    This class answers the requests of a SuiteCRM client with the responses recorded
+    by a RecordingTransport, without connecting to SuiteCRM.
+
+    Calls are matched by method and parameters, ignoring the session, and logins
+    by method alone. When the same call was recorded several times, the responses
+    are replayed in the recorded order and the last one is repeated. Each response
+    can be delayed by its recorded duration divided by speed.
+    """
+
+    def __init__(self, path, speed=None):
+        """
+        Creates a ReplayTransport instance.
+
+        :param str path: path of the log file.
+        :param float speed: replay speed relative to the recorded timing,
+            None to answer without delay.
+        """
+        self.entries = read_log(path)
+        self._speed = speed
+        self._lock = threading.Lock()
+        self._responses = {}
+        for entry in self.entries:
+            self._responses.setdefault((entry['method'], entry['parameters']), deque()).append(entry)
+
+    def post(self, url, data, **kwargs):
+        if not isinstance(data, dict):
+            raise ReplayMissError('Only form requests can be replayed')
+        key = _call_key(data.get('method'), data.get('rest_data'))
+        with self._lock:
+            responses = self._responses.get(key)
+            if not responses:
+                raise ReplayMissError('Call not recorded: %s %s' % key)
+            entry = responses.popleft() if len(responses) > 1 else responses[0]
+        if self._speed:
+            time.sleep(entry['elapsed'] / self._speed)
+        return ReplayResponse(entry, urllib.urlencode(data))
+
+
+def replay_calls(client, path, speed=None):
+    """
+    Send the calls recorded on a log through a client, reproducing the recorded workload.
+
+    Combined with a ReplayTransport, the workload is reproduced without connecting
+    to SuiteCRM, which allows profiling the client and evaluating its caching.
+
+    :param SuiteCRM client: client used to send the calls.
+    :param str path: path of the log file.
+    :param float speed: replay speed relative to the recorded call times,
+        None to send the calls without waiting.
+    :return: dict with the number of calls, failed calls and elapsed seconds.
+    :rtype: dict[str, float]
+    """
+    start = time.time()
+    calls = 0
+    failed = 0
+    for entry in read_log(path):
+        if entry['method'] == 'login':
+            continue
+        if speed:
+            delay = entry['time'] / speed - (time.time() - start)
+            if delay > 0:
+                time.sleep(delay)
+        parameters = OrderedDict([('session', client._session_id)])
+        parameters.update(json.loads(entry['parameters'], object_pairs_hook=OrderedDict))
+        calls += 1
+        try:
+            client._request(entry['method'], parameters)
+        except Exception:
+            failed += 1
+    return {
+        "calls": calls,
+        "failed": failed,
+        "seconds": time.time() - start
+    }
@@ -0,0 +1,238 @@
+#######################################################################
+# Suite PY is a simple Python client for SuiteCRM API.
+
+# Copyright (C) 2017-2018 BTACTIC, SCCL
+# Copyright (C) 2017-2018 Marc Sanchez Fauste
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#######################################################################
+
+import json
+import threading
+from collections import OrderedDict
+
+from bean import Bean
+
+
+class UnitOfWork(object):
+    """
+    This class buffers changes of Beans and relationships and writes them to SuiteCRM
+    in bulk, using save_beans and set_relationships_bulk.
+
+    Saving the same bean several times before the changes are written results in a
+    single write with the fields merged, the last value of each field winning.
+    Relating and unrelating the same records keeps only the last change.
+    Pending changes are written when they reach max_changes, every flush_interval
+    seconds from a background thread, or when commit is called. New beans are given
+    an ID before being written, so a failed write can be retried without duplicates.
+
+    It can be used as a context manager, which commits the pending changes on exit,
+    or discards them if an exception was raised.
+    """
+
+    def __init__(self, client, max_changes=100, flush_interval=None, chunk_size=100,
+                 on_error=None):
+        """
+        Creates a UnitOfWork instance.
+
+        :param SuiteCRM client: client used to write the changes.
+        :param int max_changes: number of pending beans and relationships that triggers a write.
+        :param float flush_interval: seconds between background writes, None to disable them.
+        :param int chunk_size: maximum number of beans or related ids sent on each request.
+        :param function on_error: function called with a (bean, exception) tuple for each bean
+            that could not be written, useful for background writes.
+        """
+        self.client = client
+        self.max_changes = max_changes
+        self.chunk_size = chunk_size
+        self.on_error = on_error
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._beans = OrderedDict()
+        self._relationships = OrderedDict()
+        self.stats = {'saves': 0, 'saved': 0, 'failed': 0, 'related': 0, 'relationship_failures': 0}
+        self._stopped = threading.Event()
+        self._flusher = None
+        if flush_interval:
+            self._flusher = threading.Thread(target=self._flush_periodically, args=(flush_interval,))
+            self._flusher.daemon = True
+            self._flusher.start()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._beans) + len(self._relationships)
+
+    def save(self, bean):
+        """
+        Add the current fields of a Bean to the pending changes.
+
+        :param Bean bean: Bean object. Its ID is set when a new bean is written.
+        """
+        key = (bean.module, bean['id']) if bean['id'] else (bean.module, None, id(bean))
+        with self._lock:
+            self.stats['saves'] += 1
+            change = self._beans.get(key)
+            if change is None:
+                change = self._beans[key] = ([], {})
+            if bean not in change[0]:
+                change[0].append(bean)
+            change[1].update(bean._fields)
+            pending = len(self._beans) + len(self._relationships)
+        if pending >= self.max_changes:
+            self.flush()
+
+    def relate(self, module_name, module_id, link_field_name, related_ids, name_value_list=[]):
+        """
+        Add relationships between a bean and other beans to the pending changes.
+
+        :param str module_name: name of the module that the primary record is from.
+        :param str module_id: ID of the bean in the specified module_name.
+        :param str link_field_name: name of the link field which relates to the other module.
+        :param related_ids: related record id or list of them.
+        :param dict[str, str] name_value_list: relationship attributes.
+        """
+        self._add_relationships(module_name, module_id, link_field_name, related_ids,
+                                name_value_list, False)
+
+    def unrelate(self, module_name, module_id, link_field_name, related_ids):
+        """
+        Add the removal of relationships between a bean and other beans to the pending changes.
+
+        :param str module_name: name of the module that the primary record is from.
+        :param str module_id: ID of the bean in the specified module_name.
+        :param str link_field_name: name of the link field which relates to the other module.
+        :param related_ids: related record id or list of them.
+        """
+        self._add_relationships(module_name, module_id, link_field_name, related_ids, [], True)
+
+    def _add_relationships(self, module_name, module_id, link_field_name, related_ids,
+                           name_value_list, delete):
+        if isinstance(related_ids, basestring):
+            related_ids = [related_ids]
+        attributes = json.dumps(name_value_list, sort_keys=True)
+        with self._lock:
+            for related_id in related_ids:
+                key = (module_name, module_id, link_field_name, related_id)
+                self._relationships.pop(key, None)
+                self._relationships[key] = (delete, attributes)
+            pending = len(self._beans) + len(self._relationships)
+        if pending >= self.max_changes:
+            self.flush()
+
+    def discard(self):
+        """
+        Discard the pending changes.
+        """
+        with self._lock:
+            self._beans.clear()
+            self._relationships.clear()
+
+    def flush(self):
+        """
+        Write the pending changes: first the beans, then the relationships.
+
+        :return: dict containing the number of saved beans, the list of (bean, exception)
+            tuples of the beans that failed, and the created, failed and deleted
+            relationship counts.
+        :rtype: dict[str, object]
+        """
+        with self._flush_lock:
+            with self._lock:
+                beans = self._beans
+                relationships = self._relationships
+                self._beans = OrderedDict()
+                self._relationships = OrderedDict()
+            result = {'saved': 0, 'failed': [], 'created': 0, 'relationship_failures': 0,
+                      'deleted': 0}
+            if beans:
+                self._write_beans(beans.values(), result)
+            if relationships:
+                self._write_relationships(relationships, result)
+        with self._lock:
+            self.stats['saved'] += result['saved']
+            self.stats['failed'] += len(result['failed'])
+            self.stats['related'] += result['created'] + result['deleted']
+            self.stats['relationship_failures'] += result['relationship_failures']
+        if self.on_error is not None:
+            for failure in result['failed']:
+                self.on_error(failure)
+        return result
+
+    def commit(self):
+        """
+        Write the pending changes.
+
+        :return: the result of flush.
+        :rtype: dict[str, object]
+        """
+        return self.flush()
+
+    def _write_beans(self, changes, result):
+        merged = []
+        for originals, fields in changes:
+            bean = Bean(originals[0].module)
+            bean._fields.update(fields)
+            merged.append((bean, originals))
+        saved = self.client.save_beans([bean for bean, _ in merged], self.chunk_size,
+                                       assign_ids=True)
+        failed = dict((id(bean), error) for bean, error in saved['failed'])
+        for bean, originals in merged:
+            if id(bean) in failed:
+                result['failed'].append((originals[-1], failed[id(bean)]))
+                continue
+            for original in originals:
+                original['id'] = bean['id']
+        result['saved'] = saved['saved']
+
+    def _write_relationships(self, relationships, result):
+        grouped = OrderedDict()
+        for (module_name, module_id, link_field_name, related_id), change in relationships.items():
+            grouped.setdefault(change, []).append(
+                (module_name, module_id, link_field_name, related_id))
+        for (delete, attributes), group in grouped.items():
+            written = self.client.set_relationships_bulk(group, delete, json.loads(attributes),
+                                                         self.chunk_size)
+            result['created'] += written['created']
+            result['deleted'] += written['deleted']
+            result['relationship_failures'] += written['failed']
+
+    def _flush_periodically(self, interval):
+        while not self._stopped.wait(interval):
+            try:
+                self.flush()
+            except Exception as e:
+                if self.on_error is not None:
+                    self.on_error((None, e))
+
+    def close(self):
+        """
+        Stop the background writes and write the pending changes.
+
+        :return: the result of flush.
+        :rtype: dict[str, object]
+        """
+        self._stopped.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        return self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.discard()
+        self.close()
+        return False